@@ -0,0 +1,75 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# memory and throughput of graph.Graph, usage: benchGraph.py [nodeCount]
+
+import graph
+import random
+import time
+import sys
+import os
+import tempfile
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+nodeCount = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+random.seed(0)
+
+def measure(name, function):
+    start = time.time()
+    result = function()
+    print('%-24s %8.3f s' % (name, time.time() - start))
+    return result
+
+def createNode(index):
+    nodeId = 'node_' + str(index)
+    if index % 3 == 0:
+        return graph.Node(nodeId, graph.Node.Type.JIRA, {
+            'type': 'Task', 'URL': 'url', 'code': 'TEST-' + str(index), 'summary': 'summary',
+            'assignee': 'assignee', 'status': 'Open', 'statusColor': 'blue-gray', 'completed': 0, 'estimated': 1
+            })
+    if index % 3 == 1:
+        return graph.Node(nodeId, graph.Node.Type.GIT, {'type': 'commit', 'id': str(index), 'URL': 'url'})
+    return graph.Node(nodeId, graph.Node.Type.STASH, {'reviewers': [], 'name': 'name', 'URL': 'url'})
+
+# three edges per node, every tenth one repeated and every hundredth one dangling
+edges = []
+for index in range(3 * nodeCount):
+    source = random.randrange(nodeCount)
+    target = random.randrange(nodeCount + nodeCount // 100)
+    if source != target:
+        edges.append(('node_' + str(source), 'node_' + str(target)))
+edges += edges[::10]
+
+if tracemalloc:
+    tracemalloc.start()
+
+g = graph.Graph()
+def addNodes():
+    for index in range(nodeCount):
+        g.addNode(createNode(index))
+measure('addNode', addNodes)
+measure('addEdge', lambda: sum(g.addEdge(graph.Edge(source, target)) for source, target in edges))
+
+if tracemalloc:
+    print('%-24s %8.1f MB' % ('memory', tracemalloc.get_traced_memory()[0] / 1024.0 / 1024.0))
+    tracemalloc.stop()
+
+print('%-24s %8d / %d' % ('edges kept / added', len(g.edges), len(edges)))
+measure('getDegree (all nodes)', lambda: sum(g.getDegree(nodeId) for nodeId in g.nodes))
+measure('getNeighbors (all nodes)', lambda: sum(len(g.getNeighbors(nodeId)) for nodeId in g.nodes))
+
+fileDescriptor, filePath = tempfile.mkstemp(suffix='.json')
+os.close(fileDescriptor)
+try:
+    size = measure('saveGraphJson', lambda: g.saveGraphJson(filePath, compact=True))
+    print('%-24s %8.1f MB' % ('output', size / 1024.0 / 1024.0))
+finally:
+    os.remove(filePath)
+
+def removeNodes():
+    for index in range(0, nodeCount, 10):
+        g.removeNode('node_' + str(index))
+measure('removeNode (10 %)', removeNodes)
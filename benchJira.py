@@ -0,0 +1,166 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# local stand-in for the JIRA endpoints jira.JIRA calls (board, issue, search and dev-status),
+# serving generated issues with a configurable latency per request
+#
+# usage: benchJira.py [issueCount] [latency] [port]
+
+import json
+import random
+import re
+import sys
+import threading
+import time
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+statuses = [
+    ('Open', 'new', 'blue-gray'),
+    ('In Progress', 'indeterminate', 'yellow'),
+    ('Done', 'done', 'green')
+    ]
+
+# returns (issues {key: issueData}, details {issueId: issueDetails}, board) of issueCount issues;
+# issue i has branch branchNames[i % len(branchNames)], every fifth issue is a subtask of the previous one,
+# some issues link others and some have open or merged pull requests of their branch to master
+def createIssues(branchNames, issueCount=10, seed=0, projectKey='ZPL', repositoryName='bench'):
+    generator = random.Random(seed)
+    keys = [projectKey + '-' + str(index + 1) for index in range(issueCount)]
+    issues = {}
+    details = {}
+    boardIssues = []
+    for index, key in enumerate(keys):
+        status, category, color = statuses[generator.randrange(len(statuses))]
+        issueId = str(10000 + index)
+        subtasks = [{'key': keys[index + 1]}] if (index + 1 < issueCount and (index + 1) % 5 == 4) else []
+        links = []
+        if issueCount > 1 and generator.random() < 0.1:
+            links.append({'type': {'outward': 'blocks'}, 'outwardIssue': {'key': generator.choice([other for other in keys if other != key])}})
+        issues[key] = {
+            'id': issueId,
+            'key': key,
+            'fields': {
+                'issuetype': {'name': 'Sub-task' if index % 5 == 4 else 'Task'},
+                'summary': 'Benchmark issue ' + str(index + 1),
+                'assignee': {'displayName': 'Developer ' + str(index % 7), 'avatarUrls': {'24x24': 'avatar.png'}},
+                'status': {'name': status, 'statusCategory': {'key': category, 'colorName': color}},
+                'progress': {'progress': 3600 * generator.randint(0, 8), 'total': 3600 * 8},
+                'subtasks': subtasks,
+                'issuelinks': links,
+                'priority': {'name': 'Major'},
+                'updated': '2016-01-01T10:00:00.000+0000'
+                }
+            }
+        if index % 5 != 4:
+            boardIssues.append({'key': key, 'fields': {'status': {'statusCategory': {'key': category}}}})
+            
+        branches = []
+        pullRequests = []
+        if branchNames:
+            branchName = branchNames[index % len(branchNames)]
+            branches.append({'name': branchName, 'url': 'branch/' + branchName, 'repository': {'name': repositoryName}})
+            if generator.random() < 0.4:
+                pullRequests.append({
+                    'id': '#' + str(index + 1),
+                    'name': 'Pull request of ' + key,
+                    'source': {'branch': branchName, 'repository': {'name': repositoryName}},
+                    'destination': {'branch': 'master'},
+                    'url': 'pull-requests/' + str(index + 1),
+                    'status': 'OPEN' if generator.random() < 0.7 else 'MERGED',
+                    'reviewers': [{'name': 'Reviewer ' + str(index % 3), 'approved': generator.random() < 0.5}]
+                    })
+        details[issueId] = {'detail': [{'branches': branches, 'pullRequests': pullRequests}]}
+        
+    return issues, details, {'issues': boardIssues}
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive, as the real server
+    wbufsize = -1 # one send per response
+    disable_nagle_algorithm = True
+    
+    def do_GET(self):
+        jira = self.server.jira
+        time.sleep(jira.latency)
+        url = urlparse(self.path)
+        query = dict((name, values[0]) for name, values in parse_qs(url.query).items())
+        status, result = jira.handle(url.path, query)
+        body = json.dumps(result).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        
+    def log_message(self, format, *args):
+        pass
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+# the fake JIRA at url, serving in a background thread between start() and stop();
+# searches return at most maxResults issues per page like the real server
+class FakeJira:
+    def __init__(self, issues, details, board, latency=0.0, port=0, maxResults=100):
+        self.issues = issues
+        self.details = details
+        self.board = board
+        self.latency = latency
+        self.maxResults = maxResults
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = Server(('127.0.0.1', port), RequestHandler)
+        self.server.jira = self
+        self.url = 'http://127.0.0.1:' + str(self.server.server_address[1])
+        self.thread = None
+        
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+        
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        
+    # returns (status code, response object) of a request
+    def handle(self, path, query):
+        with self.lock:
+            self.requests += 1
+        match = re.match('^/rest/agile/latest/board/[0-9]+/issue$', path)
+        if match:
+            return 200, self.board
+        match = re.match('^/rest/api/2/issue/([^/]+)$', path)
+        if match:
+            if not match.group(1) in self.issues:
+                return 404, {'errorMessages': ['Issue Does Not Exist']}
+            return 200, self.issues[match.group(1)]
+        if path == '/rest/api/2/search':
+            return self.search(query.get('jql', ''), int(query.get('startAt', 0)), int(query.get('maxResults', 50)))
+        if path == '/rest/dev-status/latest/issue/detail':
+            return 200, self.details.get(query.get('issueId'), {'detail': []})
+        return 404, {'errorMessages': ['Unknown resource ' + path]}
+        
+    # the 'key in (...)' searches of jira.JIRA; an 'updated >=' condition matches every issue
+    def search(self, jql, startAt, maxResults):
+        match = re.match(r'^key in \(([^)]*)\)', jql)
+        if not match:
+            return 400, {'errorMessages': ['Unsupported JQL ' + jql]}
+        found = [self.issues[key] for key in match.group(1).split(',') if key in self.issues]
+        maxResults = min(maxResults, self.maxResults)
+        return 200, {'startAt': startAt, 'maxResults': maxResults, 'total': len(found), 'issues': found[startAt:startAt + maxResults]}
+
+if __name__ == '__main__':
+    issueCount = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    issues, details, board = createIssues(['feature/b' + str(index) for index in range(issueCount)], issueCount)
+    fakeJira = FakeJira(issues, details, board, float(sys.argv[2]) if len(sys.argv) > 2 else 0.0, int(sys.argv[3]) if len(sys.argv) > 3 else 8080)
+    print('Serving ' + str(issueCount) + ' issues at ' + fakeJira.url)
+    fakeJira.server.serve_forever()
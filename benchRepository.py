@@ -0,0 +1,146 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# synthetic git repositories for the benchmarks, written by one 'git fast-import' so that even
+# thousands of branches take seconds; the same arguments always give the same commits
+#
+# usage: benchRepository.py path [branchCount] [depth]
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+
+class RepositoryError(Exception):
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+# fast-import stream of the history, tracking the files of every branch so merges get proper trees
+class HistoryWriter:
+    def __init__(self):
+        self.chunks = []
+        self.marks = 0
+        self.time = 1500000000
+        self.files = {}
+        self.owned = {}
+        self.tips = {}
+        
+    def data(self, text):
+        text = text.encode('utf-8')
+        self.chunks.append(b'data ' + str(len(text)).encode('ascii') + b'\n' + text + b'\n')
+        
+    # commit on branch name with changes ({path: content}); the first parent is the branch tip
+    # or parent when given (a fork), mergeName merges another branch in, whose files win
+    # except for those changed on the branch itself
+    def commit(self, name, changes, message, parent=None, mergeName=None):
+        if parent is None:
+            parent = name
+        files = dict(self.files.get(parent, {}))
+        owned = set(self.owned.get(name, ())) if parent == name else set()
+        if mergeName is not None:
+            for path, content in self.files[mergeName].items():
+                if not path in owned and files.get(path) != content:
+                    changes.setdefault(path, content)
+        elif parent in self.tips:
+            owned.update(changes)
+        files.update(changes)
+        
+        self.marks += 1
+        self.time += 60
+        self.chunks.append('commit refs/heads/{0}\nmark :{1}\ncommitter Benchmark <benchmark@example.com> {2} +0000\n'.format(name, self.marks, self.time).encode('utf-8'))
+        self.data(message)
+        if parent in self.tips:
+            self.chunks.append('from :{0}\n'.format(self.tips[parent]).encode('utf-8'))
+        if mergeName is not None:
+            self.chunks.append('merge :{0}\n'.format(self.tips[mergeName]).encode('utf-8'))
+        for path in sorted(changes):
+            self.chunks.append('M 100644 inline {0}\n'.format(path).encode('utf-8'))
+            self.data(changes[path])
+            
+        self.files[name] = files
+        self.owned[name] = owned
+        self.tips[name] = self.marks
+        
+    def getStream(self):
+        return b''.join(self.chunks) + b'done\n'
+
+# creates path/origin.git and its clone path/clone, returns (clone path, branch names, planted conflicts);
+# master gets a commit between most forks, branches have 1..depth commits and fork from master or, by
+# nestRatio, from an earlier branch; by mergeRatio a branch merges master in, by mergedRatio it is merged
+# to master; each of the conflictCount planted conflicts ([branchA, branchB]) is a pair of unmerged
+# branches changing the same line of their own file under conflicts/
+def createRepository(path, branchCount=10, depth=5, mergeRatio=0.2, mergedRatio=0.1, nestRatio=0.1, conflictCount=None, seed=0, gitExecutable='git'):
+    generator = random.Random(seed)
+    names = ['feature/b' + str(index) for index in range(branchCount)]
+    if conflictCount is None:
+        conflictCount = branchCount // 10
+        
+    # the planted conflicts stay visible as long as neither side gets merged to master
+    merged = set(name for name in names if generator.random() < mergedRatio)
+    unmerged = [name for name in names if not name in merged]
+    conflicts = []
+    plantedFiles = dict((name, {}) for name in names)
+    for index in range(conflictCount if len(unmerged) > 1 else 0):
+        pair = generator.sample(unmerged, 2)
+        conflictPath = 'conflicts/{0}.txt'.format(index)
+        for name in pair:
+            plantedFiles[name][conflictPath] = 'line changed by ' + name + '\n'
+        conflicts.append(pair)
+        
+    writer = HistoryWriter()
+    baseFiles = {'README': 'benchmark repository\n', 'src/master.txt': 'master 0\n'}
+    for index in range(len(conflicts)):
+        baseFiles['conflicts/{0}.txt'.format(index)] = 'original line\n'
+    writer.commit('master', baseFiles, 'initial commit')
+    
+    masterLines = ['master 0']
+    forked = []
+    for name in names:
+        if generator.random() < 0.7:
+            masterLines.append('master ' + str(len(masterLines)))
+            writer.commit('master', {'src/master.txt': '\n'.join(masterLines) + '\n'}, 'master ' + str(len(masterLines)))
+            
+        parent = generator.choice(forked) if (forked and generator.random() < nestRatio) else 'master'
+        branchPath = 'src/' + name.replace('/', '_') + '.txt'
+        lines = []
+        for commit in range(generator.randint(1, depth)):
+            lines.append(name + ' ' + str(commit))
+            changes = {branchPath: '\n'.join(lines) + '\n'}
+            if commit == 0:
+                changes.update(plantedFiles[name])
+            writer.commit(name, changes, name + ' ' + str(commit), parent if commit == 0 else None)
+            
+        if generator.random() < mergeRatio:
+            writer.commit(name, {}, 'Merge master into ' + name, mergeName='master')
+            lines.append(name + ' after merge')
+            writer.commit(name, {branchPath: '\n'.join(lines) + '\n'}, name + ' after merge')
+        if name in merged:
+            writer.commit('master', {}, 'Merge ' + name + ' into master', mergeName=name)
+        forked.append(name)
+        
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    originPath = os.path.join(path, 'origin.git')
+    clonePath = os.path.join(path, 'clone')
+    runGit(gitExecutable, ['init', '--quiet', '--bare', originPath])
+    runGit(gitExecutable, ['fast-import', '--quiet'], originPath, writer.getStream())
+    runGit(gitExecutable, ['symbolic-ref', 'HEAD', 'refs/heads/master'], originPath)
+    runGit(gitExecutable, ['clone', '--quiet', originPath, clonePath])
+    runGit(gitExecutable, ['config', 'user.name', 'Benchmark'], clonePath)
+    runGit(gitExecutable, ['config', 'user.email', 'benchmark@example.com'], clonePath)
+    return clonePath, names, conflicts
+    
+def runGit(gitExecutable, args, cwd=None, input=None):
+    process = subprocess.Popen([gitExecutable] + args, cwd=cwd, stdin=(subprocess.PIPE if input is not None else None), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    response = process.communicate(input)
+    if process.returncode != 0:
+        raise RepositoryError(' '.join(args[:1]) + ': ' + response[1].decode('utf-8').rstrip())
+    return response[0].decode('utf-8')
+
+if __name__ == '__main__':
+    clonePath, names, conflicts = createRepository(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 10, int(sys.argv[3]) if len(sys.argv) > 3 else 5)
+    print(clonePath)
+    print('{0} branches, {1} planted conflicts'.format(len(names), len(conflicts)))
@@ -0,0 +1,200 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# offline benchmarks of the main code paths on repositories of benchRepository and issues served by
+# benchJira, at growing numbers of branches and issues; results can be saved to compare runs
+#
+# usage: benchmark.py [--sizes 10,100,1000] [--latency 0.02] [--scenarios name,...] [--work directory] [--output results.json]
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import time
+import benchJira
+import benchRepository
+import git
+import gitGraph
+import graph
+import graphPruning
+import logic
+import metrics
+
+# GitGraph.add runs 'git merge-base' for every pair of commits, so it is only timed up to this size
+gitGraphAddLimit = 100
+
+# share of the branches merged to master in the repository of graphPruning, a sprint near its end
+prunedMergedRatio = 0.9
+
+scenarioNames = ['gitGraphAdd', 'gitGraphAddAll', 'calculateBranches', 'findConflicts', 'parseActiveSprintIssues', 'createGraph', 'graphPruning']
+
+# one generated repository and fake JIRA of size branches and issues
+class Benchmark:
+    def __init__(self, size, workDirectory, latency=0.0, gitExecutable='git'):
+        self.size = size
+        self.directory = os.path.join(workDirectory, str(size))
+        self.gitExecutable = gitExecutable
+        self.repositoryPath, self.branchNames, self.conflicts = benchRepository.createRepository(self.directory, branchCount=size, gitExecutable=gitExecutable)
+        issues, details, board = benchJira.createIssues(self.branchNames, size)
+        self.jira = benchJira.FakeJira(issues, details, board, latency).start()
+        self.branches = dict((name, False) for name in self.branchNames)
+        self.branches['master'] = True
+        
+    def close(self):
+        self.jira.stop()
+        
+    def createLogic(self):
+        return logic.Logic({
+            'jira': {
+                'url': self.jira.url,
+                'auth': None,
+                'projectKey': 'ZPL',
+                'workers': 8
+                },
+            'git': {
+                'repository': self.repositoryPath,
+                'repositoryName': 'bench',
+                'executable': self.gitExecutable,
+                'pooled': True,
+                'mergeEngine': 'mergeTree',
+                'conflictWorkers': multiprocessing.cpu_count()
+                },
+            'stash': {
+                'url': 'commit/'
+                },
+            'output': {
+                'compact': True,
+                'shards': 'details'
+                }
+            })
+            
+    def getTips(self):
+        snapshot = git.GIT(self.repositoryPath, self.gitExecutable).getRefSnapshot()
+        return [snapshot.getCommit('origin/' + name) for name in ['master'] + self.branchNames]
+        
+    def gitGraphAdd(self):
+        if self.size > gitGraphAddLimit:
+            return None
+        g = gitGraph.GitGraph(git.GIT(self.repositoryPath, self.gitExecutable))
+        for tip in self.getTips():
+            g.add(tip)
+        return {'commits': len(g.getIds())}
+        
+    def gitGraphAddAll(self):
+        g = gitGraph.GitGraph(git.GIT(self.repositoryPath, self.gitExecutable, pooled=True))
+        g.addAll(self.getTips())
+        g.git.close()
+        return {'commits': len(g.getIds())}
+        
+    def calculateBranches(self):
+        l = self.createLogic()
+        result = l.calculateBranches(self.branches, update=False, distances={})
+        l.getGitRepository().close()
+        return {'commits': len(result)}
+        
+    # the commits createGraph searches conflicts among: master and the branch tips
+    def findConflicts(self):
+        l = self.createLogic()
+        commits = [branch['id'] for branch in l.calculateBranches(self.branches, update=False) if branch['master'] or len(branch['successors']) == 0]
+        outputDirectory = os.path.join(self.directory, 'findConflicts')
+        start = time.time()
+        conflicts = l.findConflicts(commits, outputDirectory)
+        l.getGitRepository().close()
+        return {'seconds': time.time() - start, 'commits': len(commits), 'conflicts': len(conflicts), 'planted': len(self.conflicts)}
+        
+    def parseActiveSprintIssues(self):
+        requests = self.jira.requests
+        issues = self.createLogic().parseActiveSprintIssues(1)
+        return {'issues': len(issues), 'requests': self.jira.requests - requests}
+        
+    def createGraph(self):
+        outputDirectory = os.path.join(self.directory, 'createGraph')
+        if os.path.exists(outputDirectory):
+            shutil.rmtree(outputDirectory)
+        os.makedirs(outputDirectory)
+        self.createLogic().createGraph(1, os.path.join(outputDirectory, 'data.json'), masterBranches=['master'])
+        return {'metrics': metrics.current.toObject()}
+        
+    # getPrunings on the commit graph of calculateBranches of a repository where most branches are merged,
+    # as the merged pruning walks the commits of master once per merged branch
+    def graphPruning(self):
+        repositoryPath, names, conflicts = benchRepository.createRepository(os.path.join(self.directory, 'merged'), branchCount=self.size, mergedRatio=prunedMergedRatio, gitExecutable=self.gitExecutable)
+        branches = dict((name, False) for name in names)
+        branches['master'] = True
+        l = self.createLogic()
+        l.config['git']['repository'] = repositoryPath
+        g = graph.Graph()
+        result = l.calculateBranches(branches, update=False)
+        l.getGitRepository().close()
+        for branch in result:
+            branch['type'] = 'branch' if branch['branchNames'] else 'commit'
+            g.addNode(graph.Node(l.getGitNodeId(branch['id']), graph.Node.Type.GIT, branch))
+        for branch in result:
+            for successor in branch['successors']:
+                g.addEdge(graph.Edge(l.getGitNodeId(branch['id']), l.getGitNodeId(successor)))
+        start = time.time()
+        prunings = graphPruning.getPrunings(g)
+        return {'seconds': time.time() - start, 'commits': len(result), 'merged': len(prunings['merged'][''])}
+        
+    # runs a scenario, returns its results with 'seconds', None when the scenario does not run at this size
+    def run(self, name):
+        start = time.time()
+        result = getattr(self, name)()
+        if result is None:
+            return None
+        result.setdefault('seconds', time.time() - start)
+        return result
+        
+# one result line, shown right away as the larger sizes take minutes
+def report(size, name, seconds=None):
+    if seconds is None:
+        print('%-6d %-24s %10s' % (size, name, 'skipped'))
+    else:
+        print('%-6d %-24s %8.3f s' % (size, name, seconds))
+    sys.stdout.flush()
+    
+def getGitVersion(gitExecutable):
+    return benchRepository.runGit(gitExecutable, ['--version']).strip()
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks on generated repositories and a fake JIRA.')
+    parser.add_argument('--sizes', default='10,100,1000', help='comma separated numbers of branches and issues')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds the fake JIRA waits before each response')
+    parser.add_argument('--scenarios', default=','.join(scenarioNames), help='comma separated scenarios: ' + ', '.join(scenarioNames))
+    parser.add_argument('--work', default='benchmark', help='directory for the generated repositories and outputs')
+    parser.add_argument('--git', default='git', help='git executable')
+    parser.add_argument('--output', help='JSON file to save the results to')
+    arguments = parser.parse_args()
+    
+    scenarios = arguments.scenarios.split(',')
+    for name in scenarios:
+        if not name in scenarioNames:
+            parser.error('unknown scenario: ' + name)
+            
+    results = {
+        'git': getGitVersion(arguments.git),
+        'python': platform.python_version(),
+        'latency': arguments.latency,
+        'sizes': {}
+        }
+    for size in [int(size) for size in arguments.sizes.split(',')]:
+        start = time.time()
+        benchmark = Benchmark(size, arguments.work, arguments.latency, arguments.git)
+        report(size, 'generate', time.time() - start)
+        sizeResults = results['sizes'][str(size)] = {}
+        try:
+            for name in scenarios:
+                sizeResults[name] = benchmark.run(name)
+                report(size, name, sizeResults[name] and sizeResults[name]['seconds'])
+        finally:
+            benchmark.close()
+            
+    if arguments.output:
+        with open(arguments.output, 'w') as outfile:
+            json.dump(results, outfile, indent=4, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import json
+import time
+
+# on-disk store of trial merge results keyed by the (commitA, commitB) pair;
+# commits are immutable, so a stored result never gets stale
+class ConflictCache:
+    def __init__(self, path, maxEntries=100000, maxAge=30):
+        self.path = path
+        self.maxEntries = maxEntries
+        self.maxAge = maxAge # days since last use
+        self.hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS conflicts ('
+                                'commitA TEXT NOT NULL, '
+                                'commitB TEXT NOT NULL, '
+                                'files TEXT NOT NULL, '
+                                'created REAL NOT NULL, '
+                                'accessed REAL NOT NULL, '
+                                'PRIMARY KEY (commitA, commitB))')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS conflicts_accessed ON conflicts (accessed)')
+        self.connection.commit()
+
+    # returns the stored conflicts ([{'file', 'diff'}], empty when the merge was clean) or None
+    def get(self, commitA, commitB):
+        row = self.connection.execute('SELECT files FROM conflicts WHERE commitA = ? AND commitB = ?', (commitA, commitB)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.connection.execute('UPDATE conflicts SET accessed = ? WHERE commitA = ? AND commitB = ?', (time.time(), commitA, commitB))
+        return json.loads(row[0])
+
+    def put(self, commitA, commitB, conflicts):
+        now = time.time()
+        self.connection.execute('INSERT OR REPLACE INTO conflicts (commitA, commitB, files, created, accessed) VALUES (?, ?, ?, ?, ?)',
+                                (commitA, commitB, json.dumps(conflicts), now, now))
+
+    # drops entries unused for maxAge days, then the least recently used ones above maxEntries
+    def evict(self):
+        self.connection.execute('DELETE FROM conflicts WHERE accessed < ?', (time.time() - self.maxAge * 24 * 3600,))
+        self.connection.execute('DELETE FROM conflicts WHERE rowid IN '
+                                '(SELECT rowid FROM conflicts ORDER BY accessed DESC LIMIT -1 OFFSET ?)', (self.maxEntries,))
+        self.connection.commit()
+
+    def statistics(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': self.connection.execute('SELECT COUNT(*) FROM conflicts').fetchone()[0]
+            }
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
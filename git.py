@@ -2,6 +2,9 @@
 # -*- coding: utf-8 -*-
 
 import subprocess
+import metrics
+import re
+import time
 
 class Branch:
     def __init__(self, name, remote=True):
@@ -14,14 +17,111 @@ class Branch:
             'remote': self.remote
             })
 
+# all branches at one point in time, from a single 'git for-each-ref':
+# name ('origin/<name>' for remote branches) -> commit and commit -> [Branch]
+class RefSnapshot:
+    def __init__(self, refs):
+        self.commits = {}
+        self.branches = {}
+        for refName, commit in refs:
+            if refName.startswith('refs/remotes/origin/'):
+                branch = Branch(refName[len('refs/remotes/origin/'):], True)
+                if branch.name == 'HEAD':
+                    continue
+                self.commits['origin/' + branch.name] = commit
+            elif refName.startswith('refs/heads/'):
+                branch = Branch(refName[len('refs/heads/'):], False)
+                self.commits[branch.name] = commit
+            else:
+                continue
+            self.branches.setdefault(commit, []).append(branch)
+            
+    # commit of a branch name or Branch, None for unknown branches
+    def getCommit(self, id):
+        if isinstance(id, Branch):
+            id = ('origin/' + id.name) if id.remote else id.name
+        return self.commits.get(id)
+        
+    def getBranches(self, commit, remoteOnly=True):
+        return [branch for branch in self.branches.get(commit, []) if branch.remote or (not remoteOnly)]
+
+# long-lived 'git cat-file --batch-check'/'--batch' process answering one object per request
+class BatchProcess:
+    def __init__(self, gitExecutable, repositoryPath, mode):
+        self.mode = mode
+        metrics.addCall('git', 'cat-file')
+        self.process = subprocess.Popen([gitExecutable, 'cat-file', mode], cwd=repositoryPath, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        
+    # returns [objectId, objectType, size] and for '--batch' also the object content
+    def query(self, id):
+        self.process.stdin.write((id + '\n').encode('UTF-8'))
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().decode('UTF-8').rstrip('\n')
+        if not header:
+            raise GIT.GitError(self.process.poll(), 'cat-file ' + self.mode + ' terminated')
+            
+        fields = header.split(' ')
+        if len(fields) != 3:
+            raise GIT.GitError(128, header)
+            
+        if self.mode == '--batch':
+            content = self.process.stdout.read(int(fields[2]))
+            self.process.stdout.read(1)
+            fields.append(content.decode('UTF-8', 'replace'))
+        return fields
+        
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
 class GIT:
-    def __init__(self, repositoryPath, gitExecutable='git.exe'):
+    def __init__(self, repositoryPath, gitExecutable='git.exe', pooled=False):
         self.repositoryPath = repositoryPath
         self.gitExecutable = gitExecutable
+        self.pooled = pooled
+        self.batchProcesses = {}
+        
+    def close(self):
+        for process in self.batchProcesses.values():
+            process.close()
+        self.batchProcesses = {}
+        
+    def batch(self, mode):
+        if not mode in self.batchProcesses:
+            self.batchProcesses[mode] = BatchProcess(self.gitExecutable, self.repositoryPath, mode)
+        return self.batchProcesses[mode]
 
     def fetch(self):
+        self.close() # refs are about to change
         return self.runGit('fetch')
         
+    # fetches only the named branches of origin into refs/remotes/origin, skipping those already
+    # up to date, and drops the remote-tracking refs of those deleted on origin; works in bare
+    # repositories, filter ('blob:none') makes the fetch partial, blobs then come on demand
+    def fetchBranches(self, names, filter=None):
+        self.close()
+        remoteCommits = {}
+        for line in self.runGit(['ls-remote', '--heads', 'origin']).splitlines():
+            commit, refName = line.split('\t', 1)
+            remoteCommits[refName[len('refs/heads/'):]] = commit
+            
+        snapshot = self.getRefSnapshot()
+        refspecs = []
+        for name in sorted(set(names)):
+            localCommit = snapshot.getCommit('origin/' + name)
+            if name in remoteCommits:
+                if localCommit != remoteCommits[name]:
+                    refspecs.append('+refs/heads/' + name + ':refs/remotes/origin/' + name)
+            elif localCommit is not None:
+                self.runGit(['update-ref', '-d', 'refs/remotes/origin/' + name])
+                
+        if len(refspecs) != 0:
+            params = ['fetch', '--no-tags', '--stdin']
+            if filter:
+                params.append('--filter=' + filter)
+            self.runGit(params + ['origin'], input='\n'.join(refspecs) + '\n')
+        return refspecs
+        
     def status(self, short=True):
         params = ['status']
         if short:
@@ -29,6 +129,7 @@ class GIT:
         return self.runGit(params)
         
     def checkout(self, id, updateSubmodules=True, force=False):
+        self.close()
         params = ['checkout', self.parseId(id)]
         if force:
             params.append('--force')
@@ -37,18 +138,44 @@ class GIT:
             return self.runGit(['submodule', 'update', '--init', '--recursive'])
         
     def merge(self, id):
+        self.close()
         return self.runGit(['merge', self.parseId(id)])
         
     def revParse(self, id):
+        if self.pooled:
+            return self.batch('--batch-check').query(self.parseId(id))[0]
         return self.runGit(['rev-parse', self.parseId(id)])
         
+    def revParseAll(self, ids):
+        if len(ids) == 0:
+            return []
+        if self.pooled:
+            return [self.revParse(id) for id in ids]
+        return self.runGit(['rev-parse'] + [self.parseId(id) for id in ids]).splitlines()
+        
+    # raw object content through the pooled 'cat-file --batch' process
+    def catFile(self, id):
+        return self.batch('--batch').query(self.parseId(id))[3]
+        
     def mergeBase(self, id1, id2):
         return self.runGit(['merge-base', self.parseId(id1), self.parseId(id2)])
         
     def getDistance(self, olderId, newerId):
         return self.runGit(['rev-list', '--count', '--left-only', self.parseId(newerId) + '...' + self.parseId(olderId)])
         
+    # returns (commit, timestamp, parents) for all ancestors of ids but those of exclude, descendants first
+    def getAncestry(self, ids, exclude=()):
+        ancestry = []
+        if len(ids) == 0:
+            return ancestry
+        revisions = '\n'.join([self.parseId(id) for id in ids] + ['^' + self.parseId(id) for id in exclude]) + '\n'
+        for line in self.runGit(['rev-list', '--topo-order', '--parents', '--timestamp', '--stdin'], input=revisions).splitlines():
+            fields = line.split()
+            ancestry.append((fields[1], int(fields[0]), fields[2:]))
+        return ancestry
+        
     def reset(self, hard=True):
+        self.close()
         params = ['reset']
         if hard:
             params.append('--hard')
@@ -63,21 +190,80 @@ class GIT:
             params.append(path)
         return self.runGit(params)
         
+    def addWorktree(self, path, id='HEAD'):
+        return self.runGit(['worktree', 'add', '--detach', '--force', path, self.parseId(id)])
+        
+    def pruneWorktrees(self):
+        return self.runGit(['worktree', 'prune'])
+        
+    def getRefSnapshot(self):
+        refs = []
+        for line in self.runGit(['for-each-ref', '--format=%(objectname) %(refname)', 'refs/heads', 'refs/remotes']).splitlines():
+            commit, refName = line.split(' ', 1)
+            refs.append((refName, commit))
+        return RefSnapshot(refs)
+        
     def getBranches(self, id, remoteOnly=True):
-        branches = []
-        refListStr = self.runGit(['log', '--format="%d"', '--max-count=1', id])
-        refList = refListStr.strip('"').strip().lstrip('(').rstrip(')').split(', ')
-        for item in refList:
-            if not 'tag:' in item:
-                remote = item.startswith('origin/')
-                name = item[len('origin/'):] if remote else item
-                if remote or (not remoteOnly):
-                    branches.append(Branch(name, remote))
-        return branches
+        return self.getRefSnapshot().getBranches(self.revParse(id), remoteOnly)
         
     def getInfo(self, id):
         return self.runGit(['log', '--max-count=1', self.parseId(id)])
         
+    # getInfo for many commits with a single 'git log --no-walk --stdin', returns {id: info}
+    def getInfos(self, ids):
+        commits = self.revParseAll(ids)
+        infos = {}
+        unique = list(set(commits))
+        if len(unique) != 0:
+            info = None
+            for line in self.runGit(['log', '--no-walk=unsorted', '--stdin'], input='\n'.join(unique) + '\n').splitlines():
+                if line.startswith('commit '):
+                    info = [line]
+                    infos[line.split(' ')[1]] = info
+                else:
+                    info.append(line)
+        
+        result = {}
+        for id, commit in zip(ids, commits):
+            result[id] = '\n'.join(infos[commit]).rstrip()
+        return result
+        
+    # merges without touching the working tree or index ('git merge-tree --write-tree'),
+    # returns the merged tree and {path: set(stages)} of unmerged paths in path order
+    def mergeTree(self, id1, id2):
+        output = self.runGit(['merge-tree', '--write-tree', '--no-messages', '-z', self.parseId(id1), self.parseId(id2)], acceptedReturnCodes=(0, 1))
+        fields = output.split('\0')
+        paths = []
+        stages = {}
+        for entry in fields[1:]:
+            if not entry:
+                continue
+            info, path = entry.split('\t', 1)
+            if not path in stages:
+                paths.append(path)
+                stages[path] = set()
+            stages[path].add(int(info.split(' ')[2]))
+        return fields[0], [(path, stages[path]) for path in paths]
+        
+    # 'merge-tree --write-tree' came with git 2.38, older versions run the trivial merge of the same command
+    def supportsMergeTree(self):
+        version = re.search(r'(\d+)\.(\d+)', self.runGit(['version']))
+        return (version is not None) and (int(version.group(1)), int(version.group(2))) >= (2, 38)
+        
+    # same result as conflicts() after merging id2 into id1, computed in memory
+    def mergeConflicts(self, id1, id2):
+        tree, unmerged = self.mergeTree(id1, id2)
+        conflicts = []
+        for path, stages in unmerged:
+            # status reports neither 'DD' nor 'AA' entries with 'U'
+            if stages == set([1]) or stages == set([2, 3]):
+                continue
+            conflicts.append({
+                            'file': path,
+                            'diff': self.runGit(['diff', tree, self.parseId(id1), self.parseId(id2), '--', path])
+                            })
+        return conflicts
+        
     def conflicts(self):
         conflicts = []
         for line in self.status().splitlines():
@@ -103,14 +289,16 @@ class GIT:
         def __str__(self):
             return str(self.result_code) + ': ' + self.text
 
-    def runGit(self, args):
+    def runGit(self, args, input=None, acceptedReturnCodes=(0,)):
         params = args
         if not type(args) is list:
             params = [args]
             
-        process = subprocess.Popen([self.gitExecutable] + params, cwd=self.repositoryPath, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        response = process.communicate()
-        if process.returncode != 0:
+        start = time.time()
+        process = subprocess.Popen([self.gitExecutable] + params, cwd=self.repositoryPath, stdin=(subprocess.PIPE if input is not None else None), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        response = process.communicate(input.encode('UTF-8') if input is not None else None)
+        metrics.addCall('git', params[0], time.time() - start)
+        if not process.returncode in acceptedReturnCodes:
             raise self.GitError(process.returncode, response[1].decode('UTF-8').rstrip())
             
         return response[0].decode('UTF-8').rstrip()
\ No newline at end of file
@@ -2,6 +2,83 @@
 # -*- coding: utf-8 -*-
 
 import copy
+import itertools
+import json
+
+# transitive predecessors/successors of GitGraph nodes as int bitsets
+class ReachabilityIndex:
+    def __init__(self, predecessors, successors):
+        self.ids = []
+        self.bits = {}
+        self.ancestors = {}
+        self.descendants = {}
+        
+        self.order = self.getTopologicalOrder(predecessors, successors)
+        for id in self.order:
+            self.bits[id] = 1 << len(self.ids)
+            self.ids.append(id)
+            
+        for id in self.order:
+            mask = 0
+            for P in predecessors[id]:
+                mask |= self.ancestors[P] | self.bits[P]
+            self.ancestors[id] = mask
+            
+        for id in reversed(self.order):
+            mask = 0
+            for S in successors[id]:
+                mask |= self.descendants[S] | self.bits[S]
+            self.descendants[id] = mask
+            
+    def getTopologicalOrder(self, predecessors, successors):
+        order = []
+        counts = {}
+        for id, P in predecessors.items():
+            counts[id] = len(P)
+            if len(P) == 0:
+                order.append(id)
+        for id in order: # order grows while iterating
+            for S in successors[id]:
+                counts[S] -= 1
+                if counts[S] == 0:
+                    order.append(S)
+        return order
+        
+    def insert(self, id, predecessors, successors):
+        bit = 1 << len(self.ids)
+        self.bits[id] = bit
+        self.ids.append(id)
+        
+        ancestors = 0
+        for P in predecessors:
+            ancestors |= self.ancestors[P] | self.bits[P]
+        descendants = 0
+        for S in successors:
+            descendants |= self.descendants[S] | self.bits[S]
+        self.ancestors[id] = ancestors
+        self.descendants[id] = descendants
+        
+        for A in self.getIds(ancestors):
+            self.descendants[A] |= bit
+        for D in self.getIds(descendants):
+            self.ancestors[D] |= bit
+        self.order = None
+        
+    def getMask(self, ids):
+        mask = 0
+        for id in ids:
+            mask |= self.bits[id]
+        return mask
+        
+    def getIds(self, mask):
+        ids = set()
+        index = 0
+        while mask:
+            if mask & 1:
+                ids.add(self.ids[index])
+            mask >>= 1
+            index += 1
+        return ids
 
 class GitGraph:
     def __init__(self, git):
@@ -9,14 +86,21 @@ class GitGraph:
         self.nodes = set()
         self.predecessors = {}
         self.successors = {}
+        self.index = None
+        self.walk = None # (parents, masks, bits) of the last ancestry walk
+        self.ancestry = None # (order, timestamps, parents) of the last ancestry walk
+        self.boundary = None # (oldest node, its parents) when all nodes descend from it, walks stop at the parents
+        self.distances = {} # (A, S): commit count, commits never change
+        self.tips = {} # name: commit of the tips requested in update(), the nodes are built from them
         
     def __repr__(self):
+        distances = self.getDistances()
         result = ''
         for id in self.nodes:
             result += '\n' + id
             
             for S in self.getSuccessors(id):
-                result += '\n\t' + id + ' ->(' + self.git.getDistance(id, S) + ') ' + S
+                result += '\n\t' + id + ' ->(' + str(distances[(id, S)]) + ') ' + S
             
         return result
         
@@ -36,12 +120,8 @@ class GitGraph:
         if direct:
             return self.predecessors[id]
         else:
-            directPredecessors = self.predecessors[id]
-            predecessors = copy.deepcopy(directPredecessors)
-            for P in directPredecessors:
-                predecessors.update(self.getPredecessors(P, False))
-             
-            return predecessors
+            index = self.getIndex()
+            return index.getIds(index.ancestors[id])
         
     def getSuccessors(self, id, direct=True):
         if not self.has(id):
@@ -50,16 +130,423 @@ class GitGraph:
         if direct:
             return self.successors[id]
         else:
-            directSuccessors = self.successors[id]
-            successors = copy.deepcopy(directSuccessors)
-            for S in directSuccessors:
-                successors.update(self.getSuccessors(S, False))
-             
-            return successors
+            index = self.getIndex()
+            return index.getIds(index.descendants[id])
+            
+    def getIndex(self):
+        if not self.index:
+            self.index = ReachabilityIndex(self.predecessors, self.successors)
+        return self.index
+        
+    def getMask(self, ids):
+        return self.getIndex().getMask(ids)
+        
+    # bitset of all (transitive) predecessors, comparable with getMask()
+    def getPredecessorMask(self, id):
+        if not self.has(id):
+            raise self.Error('Id not added: ' + id)
+        return self.getIndex().ancestors[id]
+        
+    # bitset of all (transitive) successors, comparable with getMask()
+    def getSuccessorMask(self, id):
+        if not self.has(id):
+            raise self.Error('Id not added: ' + id)
+        return self.getIndex().descendants[id]
         
     def getIds(self):
         return copy.deepcopy(self.nodes)
         
+    # adds all gitIds at once from a single ancestry walk, returns {gitId: commit}
+    def addAll(self, gitIds):
+        commits = self.git.revParseAll(gitIds)
+        nodes = self.nodes | set(commits)
+        self.build(nodes, self.getCoveringAncestry(nodes))
+        self.tips = {} # the nodes are not the ones of the update() tips anymore
+        return dict(zip(gitIds, commits))
+        
+    # (order, timestamps, parents) of all ancestors of nodes but those of exclude, children first
+    def getAncestry(self, nodes, exclude=()):
+        order = []
+        timestamps = {}
+        parents = {}
+        for commit, timestamp, commitParents in self.git.getAncestry(nodes, exclude):
+            order.append(commit)
+            timestamps[commit] = timestamp
+            parents[commit] = commitParents
+        return (order, timestamps, parents)
+        
+    # an ancestry walk of ids from which their merge-bases are found: the last walk when it covers them,
+    # otherwise one stopped at the parents of the oldest node (self.boundary), or a walk of all ancestors
+    def getCoveringAncestry(self, ids):
+        if (self.ancestry is not None) and self.isCovering(self.ancestry, ids):
+            return self.ancestry
+        if self.boundary is not None:
+            try:
+                ancestry = self.getAncestry(ids, self.boundary[1])
+                if self.isCovering(ancestry, ids):
+                    return ancestry
+            except self.git.GitError:
+                pass # the boundary is gone from the repository
+        return self.getAncestry(ids)
+        
+    # whether ancestry holds all best common ancestors of pairs of ids: the commits left out of it are
+    # ancestors of the oldest node (self.boundary), which is then an ancestor of every id reaching them
+    def isCovering(self, ancestry, ids):
+        order, timestamps, parents = ancestry
+        root = self.boundary[0] if self.boundary is not None else None
+        bounded = {}
+        rooted = {}
+        for commit in reversed(order):
+            commitBounded = False
+            commitRooted = (commit == root)
+            for P in parents[commit]:
+                if P in parents:
+                    commitBounded = commitBounded or bounded[P]
+                    commitRooted = commitRooted or rooted[P]
+                else:
+                    commitBounded = True
+            bounded[commit] = commitBounded
+            rooted[commit] = commitRooted
+        for id in ids:
+            if (not id in parents) or (bounded[id] and not rooted[id]):
+                return False
+        return True
+        
+    # the oldest node and its parents when all nodes descend from it, walks stop at its parents
+    def setBoundary(self, ancestry):
+        roots = [id for id in self.nodes if len(self.predecessors[id]) == 0]
+        if len(roots) == 1:
+            self.boundary = (roots[0], list(ancestry[2][roots[0]]))
+        else:
+            self.boundary = None
+        
+    # makes the graph the one of nodes closed under merge-base; ancestry (getCoveringAncestry) covers
+    # at least the ancestors of nodes, other commits in it do not change the result
+    def build(self, nodes, ancestry):
+        order, timestamps, parents = ancestry
+        nodes = set(nodes)
+        children = self.getChildren(order, parents)
+                
+        # close the node set under merge-base, the same way repeated add() does
+        while True:
+            bits = self.getBits(nodes)
+            masks = self.getDescendantMasks(order, parents, bits)
+            mergeBases = self.getMergeBases(order, children, timestamps, bits, masks)
+            if mergeBases.issubset(nodes):
+                break
+            if not self.isCovering(ancestry, mergeBases):
+                # a merge-base reaches commits left out of the walk, below the oldest node
+                ancestry = self.getAncestry(nodes)
+                order, timestamps, parents = ancestry
+                children = self.getChildren(order, parents)
+            nodes.update(mergeBases)
+            
+        self.setNodes(nodes, ancestry, bits, masks)
+        
+    # inserts ids (no nodes) with the merge-bases they make, closed under merge-base again; only the pairs
+    # of an inserted commit are looked at, on an ancestry walk down to the oldest node
+    def insertAll(self, ids):
+        nodes = self.nodes | set(ids)
+        ancestry = self.getCoveringAncestry(nodes)
+        order, timestamps, parents = ancestry
+        children = self.getChildren(order, parents)
+        
+        inserted = set(ids)
+        while True:
+            bits = self.getBits(nodes)
+            masks = self.getDescendantMasks(order, parents, bits)
+            mergeBases = set()
+            for id in inserted:
+                mergeBases.update(self.getMergeBasesOf(id, parents, children, timestamps, bits, masks))
+            inserted = mergeBases - nodes
+            if not inserted:
+                break
+            if not self.isCovering(ancestry, inserted):
+                # a merge-base reaches commits left out of the walk, below the oldest node
+                ancestry = self.getAncestry(nodes)
+                order, timestamps, parents = ancestry
+                children = self.getChildren(order, parents)
+            nodes.update(inserted)
+            
+        self.setNodes(nodes, ancestry, bits, masks)
+        
+    # makes nodes the graph, the direct predecessors taken on the ancestry walk with the bits and masks of nodes
+    def setNodes(self, nodes, ancestry, bits, masks):
+        order, timestamps, parents = ancestry
+        ids = dict((bit, id) for id, bit in bits.items())
+        
+        # nearest ancestors in the node set, reduced to the direct ones
+        ancestorMasks = {}
+        predecessors = {}
+        for commit in reversed(order):
+            mask = 0
+            for P in parents[commit]:
+                mask |= bits[P] if P in bits else ancestorMasks.get(P, 0)
+            ancestorMasks[commit] = mask
+            if commit in bits:
+                predecessors[commit] = set([ids[bit] for bit in self.getSetBits(mask) if (masks[ids[bit]] & mask) == bit])
+        
+        self.nodes = nodes
+        self.predecessors = {}
+        self.successors = {}
+        self.index = None
+        for A in nodes:
+            self.predecessors[A] = predecessors[A]
+            self.successors[A] = set()
+        for A in nodes:
+            for P in predecessors[A]:
+                self.successors[P].add(A)
+                
+        self.walk = (parents, masks, bits)
+        self.ancestry = ancestry
+        self.setBoundary(ancestry)
+        
+    def getChildren(self, order, parents):
+        children = {}
+        for commit in order:
+            for P in parents[commit]:
+                children.setdefault(P, []).append(commit)
+        return children
+        
+    # {(A, S): count} for every edge A -> S, the number of commits reachable from S but not from A
+    # (what 'git rev-list --count --left-only S...A' gives), counted on the ancestry walk of addAll;
+    # counts of edges already known are kept
+    def getDistances(self):
+        distances = {}
+        missing = []
+        for A in self.nodes:
+            for S in self.successors[A]:
+                if (A, S) in self.distances:
+                    distances[(A, S)] = self.distances[(A, S)]
+                else:
+                    missing.append((A, S))
+                    
+        if missing:
+            if (self.walk is None) or (not self.nodes.issubset(self.walk[2])):
+                self.walk = self.getWalk(self.nodes)
+            parents, masks, bits = self.walk
+            for A, S in missing:
+                distances[(A, S)] = self.getDistance(A, S, parents, masks, bits)
+                
+        self.distances = distances
+        return dict(distances)
+        
+    # walks back from S, stopping at the ancestors of A; the commits left out of the walk are ancestors of A
+    def getDistance(self, A, S, parents, masks, bits):
+        bit = bits[A]
+        visited = set([S])
+        stack = [S]
+        while stack:
+            commit = stack.pop()
+            for P in parents[commit]:
+                if (not P in visited) and (P in masks) and (not masks[P] & bit):
+                    visited.add(P)
+                    stack.append(P)
+        return len(visited)
+        
+    def getWalk(self, nodes):
+        self.ancestry = self.getCoveringAncestry(nodes)
+        order, timestamps, parents = self.ancestry
+        bits = self.getBits(nodes)
+        return (parents, self.getDescendantMasks(order, parents, bits), bits)
+        
+    def getBits(self, ids):
+        bits = {}
+        for index, id in enumerate(sorted(ids)):
+            bits[id] = 1 << index
+        return bits
+        
+    # for each commit the mask of nodes it is an ancestor of (or equal to)
+    def getDescendantMasks(self, order, parents, bits):
+        masks = dict.fromkeys(order, 0)
+        for commit in order:
+            mask = masks[commit] | bits.get(commit, 0)
+            masks[commit] = mask
+            for P in parents[commit]:
+                if P in masks:
+                    masks[P] |= mask
+        return masks
+        
+    # merge-bases of all node pairs; when a pair has several best common ancestors
+    # the newest one is taken, as 'git merge-base' does
+    def getMergeBases(self, order, children, timestamps, bits, masks):
+        ids = dict((bit, id) for id, bit in bits.items())
+        best = {}
+        for commit in order:
+            mask = masks[commit] & ~bits.get(commit, 0)
+            childMasks = [masks[C] for C in children.get(commit, [])]
+            if (mask & (mask - 1)) == 0 or mask in childMasks:
+                continue
+                
+            # only the pairs not both below a single child, B after A in the bit (sorted id) order
+            for bitA in self.getSetBits(mask):
+                covered = (bitA << 1) - 1
+                for childMask in childMasks:
+                    if childMask & bitA:
+                        covered |= childMask
+                A = ids[bitA]
+                for bitB in self.getSetBits(mask & ~covered):
+                    key = (A, ids[bitB])
+                    if (not key in best) or ((timestamps[commit], commit) > (timestamps[best[key]], best[key])):
+                        best[key] = commit
+                        
+        return set(best.values())
+        
+    # merge-bases of id with every node, as getMergeBases gives them, found on the ancestors of id alone
+    def getMergeBasesOf(self, id, parents, children, timestamps, bits, masks):
+        ancestors = set([id])
+        stack = [id]
+        while stack:
+            commit = stack.pop()
+            for P in parents[commit]:
+                if (P in parents) and (not P in ancestors):
+                    ancestors.add(P)
+                    stack.append(P)
+                    
+        # B is not below a child of commit which is an ancestor of id too
+        ids = dict((bit, id) for id, bit in bits.items())
+        best = {}
+        for commit in ancestors:
+            if commit == id:
+                continue
+            mask = masks[commit] & ~bits.get(commit, 0) & ~bits[id]
+            for C in children.get(commit, []):
+                if C in ancestors:
+                    mask &= ~masks[C]
+            for bit in self.getSetBits(mask):
+                B = ids[bit]
+                if (not B in best) or ((timestamps[commit], commit) > (timestamps[best[B]], best[B])):
+                    best[B] = commit
+        return set(best.values())
+        
+    # the single bit masks of mask, lowest first
+    def getSetBits(self, mask):
+        while mask:
+            bit = mask & -mask
+            yield bit
+            mask ^= bit
+        
+    # makes the graph the one of tips ({name: gitId}), the same as addAll of the tips alone; returns {name: commit}.
+    # The nodes which are no tips and no merge-bases anymore are removed by prune(), the new tips are inserted
+    # by insertAll(); the graph is built again when prune() cannot tell the merge-bases
+    def update(self, tips):
+        names = list(tips.keys())
+        commits = self.git.revParseAll([tips[name] for name in names])
+        tipIds = set(commits)
+        if self.nodes and self.prune(tipIds):
+            if not tipIds.issubset(self.nodes):
+                self.insertAll(tipIds - self.nodes)
+        else:
+            self.build(tipIds, self.getCoveringAncestry(tipIds))
+        self.tips = dict(zip(names, commits))
+        return dict(self.tips)
+        
+    # removes the nodes which are no tips and have less than two direct successors, on the graph alone;
+    # what remains is the merge-base closure of the tips or more. Each other node is a best common ancestor of
+    # two of its direct successors, it is their merge-base when it is their only one among the nodes; returns
+    # False when some node is the merge-base of no such pair, a pair with several best common ancestors
+    # then tells nothing
+    def prune(self, tipIds):
+        index = self.getIndex()
+        candidates = list(self.nodes - tipIds)
+        while candidates:
+            id = candidates.pop()
+            if (not self.has(id)) or (len(self.successors[id]) >= 2):
+                continue
+            predecessors = self.predecessors[id]
+            self.remove(id, index)
+            candidates.extend(predecessors - tipIds)
+            
+        nodesMask = index.getMask(self.nodes)
+        for id in self.nodes - tipIds:
+            below = index.ancestors[id] | index.bits[id]
+            if not any((index.ancestors[A] | index.bits[A]) & (index.ancestors[B] | index.bits[B]) & nodesMask & ~below == 0
+                       for A, B in itertools.combinations(self.successors[id], 2)):
+                return False
+        return True
+            
+    # removes id, its predecessors get its successors unless another path connects them; index
+    # (getIndex() of the graph before removals) keeps telling the paths between the remaining nodes.
+    # P -> id -> S counts the commits of P -> S, as the ancestors of P are ancestors of id
+    def remove(self, id, index):
+        if not self.has(id):
+            raise self.Error('Id not added: ' + id)
+            
+        predecessors = self.predecessors.pop(id)
+        successors = self.successors.pop(id)
+        self.nodes.discard(id)
+        for P in predecessors:
+            self.successors[P].discard(id)
+        for S in successors:
+            self.predecessors[S].discard(id)
+            
+        # another path P -> Q -> ... -> S never went through id, P -> id would not be direct
+        for P in predecessors:
+            for S in successors:
+                if not any((Q == S) or (index.descendants[Q] & index.bits[S]) for Q in self.successors[P]):
+                    self.successors[P].add(S)
+                    self.predecessors[S].add(P)
+                    if ((P, id) in self.distances) and ((id, S) in self.distances):
+                        self.distances[(P, S)] = self.distances[(P, id)] + self.distances[(id, S)]
+        self.index = None
+        
+    # walks the ancestry of the nodes unless the last walk covers them, so that copies share it
+    def walkAncestry(self):
+        self.ancestry = self.getCoveringAncestry(self.nodes)
+            
+    # independent copy sharing the ancestry walk, e.g. to update() a graph of more tips to some of them
+    def copy(self):
+        g = GitGraph(self.git)
+        g.nodes = set(self.nodes)
+        g.predecessors = dict([(id, set(P)) for id, P in self.predecessors.items()])
+        g.successors = dict([(id, set(S)) for id, S in self.successors.items()])
+        g.walk = self.walk
+        g.ancestry = self.ancestry
+        g.boundary = self.boundary
+        g.distances = dict(self.distances)
+        g.tips = dict(self.tips)
+        return g
+        
+    def clear(self):
+        self.nodes = set()
+        self.predecessors = {}
+        self.successors = {}
+        self.index = None
+        self.walk = None
+        self.ancestry = None
+        self.boundary = None
+        self.distances = {}
+        self.tips = {}
+        
+    # stores nodes with their direct predecessors, edge distances, tips and the boundary of walks as compact JSON
+    def save(self, path):
+        data = {
+            'tips': self.tips,
+            'predecessors': dict([(id, sorted(self.predecessors[id])) for id in self.nodes]),
+            'distances': [[A, S, distance] for (A, S), distance in self.distances.items()],
+            'boundary': self.boundary
+            }
+        with open(path, 'w') as outfile:
+            json.dump(data, outfile, separators=(',', ':'))
+            
+    # replaces the graph with the one stored by save()
+    def load(self, path):
+        with open(path, 'r') as infile:
+            data = json.load(infile)
+            
+        self.clear()
+        self.tips = data['tips']
+        for id, predecessors in data['predecessors'].items():
+            self.nodes.add(id)
+            self.predecessors[id] = set(predecessors)
+            self.successors[id] = set()
+        for id in self.nodes:
+            for P in self.predecessors[id]:
+                self.successors[P].add(id)
+        self.distances = dict([((A, S), distance) for A, S, distance in data['distances']])
+        if data.get('boundary') is not None:
+            self.boundary = (data['boundary'][0], data['boundary'][1])
+        
     def add(self, gitId):
         A = self.git.revParse(gitId)
         if self.has(A):
@@ -121,4 +608,6 @@ class GitGraph:
                         self.predecessors[S].discard(B)
                         self.successors[B].discard(S)
                         
-        self.nodes.add(A)
\ No newline at end of file
+        self.nodes.add(A)
+        if self.index:
+            self.index.insert(A, self.predecessors[A], self.successors[A])
\ No newline at end of file
@@ -18,6 +18,92 @@ function issueIsOpen(issueData) {
     return issueData.status == 'Open';
 }
 
+// merges a detail shard into the node data, arrays item by item and objects key by key where the
+// data still holds a part of them; fields moved out as a whole (e.g. reviewers) are assigned
+function mergeDetails(data, details) {
+    for (var key in details) {
+        if ($.isArray(details[key]) && $.isArray(data[key])) {
+            for (var index = 0; index < details[key].length; index++) {
+                mergeDetails(data[key][index], details[key][index]);
+            }
+        } else if ($.isPlainObject(details[key]) && $.isPlainObject(data[key])) {
+            mergeDetails(data[key], details[key]);
+        } else {
+            data[key] = details[key];
+        }
+    }
+}
+
+// fetches the detail shard of a node (sharded output) once and calls callback when it is merged
+function loadDetails(nodeData, callback) {
+    if (!nodeData.details) {
+        callback();
+        return;
+    }
+
+    if (!nodeData.detailsRequest) {
+        nodeData.detailsRequest = $.ajax({
+            url: nodeData.details,
+            cache: false,
+            dataType: "json"
+        }).done(function(details) {
+            mergeDetails(nodeData.data, details);
+        });
+    }
+    nodeData.detailsRequest.done(callback);
+}
+
+// applies a delta pushed by graphServer.py to the content of data.json: nodes are replaced or added by id,
+// edges matched by source, target and type, the other changed fields copied
+function applyDelta(content, delta) {
+    var edgeKey = function (edge) {
+        return edge.source + '\n' + edge.target + '\n' + (edge.type || '');
+    };
+
+    var changedNodes = {};
+    delta.nodes.forEach(function (node) {
+        changedNodes[node.id] = node;
+    });
+    var removedNodeIds = new Set(delta.removedNodes);
+    var nodes = [];
+    content.nodes.forEach(function (node) {
+        if (removedNodeIds.has(node.id)) return;
+        if (node.id in changedNodes) {
+            nodes.push(changedNodes[node.id]);
+            delete changedNodes[node.id];
+        } else {
+            nodes.push(node);
+        }
+    });
+    delta.nodes.forEach(function (node) {
+        if (node.id in changedNodes) nodes.push(node);
+    });
+    content.nodes = nodes;
+
+    var removedEdgeKeys = new Set(delta.removedEdges.map(edgeKey));
+    content.edges = content.edges.filter(function (edge) {
+        return !removedEdgeKeys.has(edgeKey(edge));
+    }).concat(delta.edges);
+
+    for (var key in delta.fields) {
+        content[key] = delta.fields[key];
+    }
+}
+
+// appends a tooltip with getText(data) to svgElement, refreshed once the detail shard is loaded on first hover
+function appendDetailsTitle(svgElement, nodeData, getText) {
+    var svgTooltip = Viva.Graph.svg('title').text(getText(nodeData.data));
+    svgElement.append(svgTooltip);
+
+    if (nodeData.details) {
+        $(svgElement).one('mouseenter', function() {
+            loadDetails(nodeData, function() {
+                svgTooltip.text(getText(nodeData.data));
+            });
+        });
+    }
+}
+
 function renderGraph(content, options) {
 
     var graph = Viva.Graph.graph();
@@ -31,6 +117,7 @@ function renderGraph(content, options) {
     var hideOrphans = (options.indexOf('hide-orphans') != -1);
 
     var displayedNodeIds = new Set();
+    var positioned = true; // all displayed nodes have their position from the server
 
     var nodeToEdgesMap = {};
     var nodeToDataMap = {};
@@ -50,6 +137,7 @@ function renderGraph(content, options) {
 
         graph.addNode(node.id, node);
         displayedNodeIds.add(node.id);
+        if (!node.position) positioned = false;
     }
     
     for (var index = 0; index < content.edges.length; index++) {
@@ -65,77 +153,43 @@ function renderGraph(content, options) {
     
     
     
-    // returns true when there exists a path from sourceId to targetId without using node from omitIds
-    function commitPairIsConnected(sourceId, targetId, omitIds, directed) {
-        var connected = false;
-        graph.forEachLinkedNode(sourceId, function(otherNode, link){
-            if (directed && link.fromId != sourceId) return;
-            if (omitIds.indexOf(otherNode.id) != -1) return;
-            if (otherNode.data.type != 'git' || otherNode.data.data.type == 'conflict') return;
-            
-            if (connected = connected || (otherNode.id == targetId)) return;
-            
-            if (commitPairIsConnected(otherNode.id, targetId, omitIds.concat([sourceId]), directed)) {
-                connected = true;
-            }
-        });
-        return connected;
-    }
-    
-    // returns true when there exists a path (indirected) among all nodeIds without using node from omitIds
+    // returns true when all nodeIds are connected (indirected) through git commits and branches without using node from omitIds
     function commitsAreConnected(nodeIds, omitIds) {
-        for (var index1 = 0; index1 < nodeIds.length; index1++) {
-            for (var index2 = index1 + 1; index2 < nodeIds.length; index2++) {
-                if (!commitPairIsConnected(nodeIds[index1], nodeIds[index2], omitIds)) return false;
-            }
+        if (nodeIds.length < 2) return true;
+
+        var visitedIds = new Set(omitIds);
+        var remainingIds = new Set(nodeIds);
+        var stack = [nodeIds[0]];
+        visitedIds.add(nodeIds[0]);
+        remainingIds.delete(nodeIds[0]);
+        while (stack.length > 0 && remainingIds.size > 0) {
+            graph.forEachLinkedNode(stack.pop(), function(otherNode) {
+                if (visitedIds.has(otherNode.id)) return;
+                if (otherNode.data.type != 'git' || otherNode.data.data.type == 'conflict') return;
+
+                visitedIds.add(otherNode.id);
+                remainingIds.delete(otherNode.id);
+                stack.push(otherNode.id);
+            });
         }
-        return true;
+        return remainingIds.size == 0;
     }
     
     
 
+    // inactive issues and merged branches come precomputed (graphPruning.py) for the displayed node types;
+    // data.json written without them removes nothing
+    var prunings = content.prunings || {};
     var nodeIdsToRemove = new Set();
-    if (!showALLissues) {
-        var isInactiveIssue = function(node, graph, level) {
-            if (level > 20) return false;
-            if (node.data.type != 'JIRA') return false;
-
-            var issueData = node.data.data;
-            if (!issueIsDone(issueData) && !issueIsOpen(issueData)) return false;
-            if ('pullRequests' in issueData) {
-                var inactive = true;
-                issueData.pullRequests.forEach(function(pullRequest) {
-                    if (pullRequest.status == 'OPEN') inactive = false;
-                });
-                if (!inactive) return false;
-            }
-            if ('branches' in issueData || 'subtasks' in issueData) {
-                var inactive = true;
-                graph.getLinks(node.id).forEach(function(link) {
-                    var target = graph.getNode(link.toId);
-                    switch (target.data.type) {
-                        case 'JIRA':
-                            if (isInactiveIssue(target, graph, level+1)) {
-                                inactive = false;
-                            }
-                            break;
-                        case 'git':
-                            if (!target.data.data.inMaster && !target.data.data.master) {
-                                inactive = false;
-                            }
-                            break;
-                    }
-                });
-                if (!inactive) return false;
-            }
-            return true;
-        };
-
-        graph.forEachNode(function(node) {
-            if (isInactiveIssue(node, graph, 0)) {
-                nodeIdsToRemove.add(node.id);
-            }
+    var addNodeIdsToRemove = function(pruning, key) {
+        if (!pruning || !pruning[key]) return;
+        pruning[key].forEach(function(nodeId) {
+            nodeIdsToRemove.add(nodeId);
         });
+    };
+
+    if (!showALLissues) {
+        addNodeIdsToRemove(prunings.inactive, showBranches ? 'branches' : '');
     }
 
     if (hideOrphans) {
@@ -147,45 +201,7 @@ function renderGraph(content, options) {
     }
     
     if (!showMergedBranches) {
-        var changed = true;
-        while(changed) {
-            changed = false;
-            graph.forEachNode(function(node) {
-                if (!(node.data.type == 'git' && node.data.data.inMaster && !nodeIdsToRemove.has(node.id))) return;
-            
-                var isImportant = false;
-                graph.getLinks(node.id).forEach(function(linkTo) {
-                    var target = graph.getNode(linkTo.toId);
-                    if (!isImportant && target.data.type == 'git' && target.id != node.id && !nodeIdsToRemove.has(target.id)) {
-                        graph.getLinks(node.id).forEach(function(linkFrom) {
-                            var source = graph.getNode(linkFrom.fromId);
-                            if (!isImportant && source.data.type == 'git' && source.id != node.id && !nodeIdsToRemove.has(source.id)) {
-                                if (!commitPairIsConnected(source.id, target.id, [...nodeIdsToRemove, node.id], true))
-                                    isImportant = true;
-                            }
-                        });
-                    }
-                });
-                
-                if (!isImportant) {
-                    var links = graph.getLinks(node.id);
-                    
-                    var neighborIds = [];
-                    for (var index = 0; index < links.length; index++) {
-                        var link = links[index];
-                        var otherId = (link.fromId == node.id ? link.toId : link.fromId);
-                        var otherNode = graph.getNode(otherId);
-                        if (otherNode.data.type != 'git' || otherNode.data.data.type == 'conflict' || nodeIdsToRemove.has(otherId)) continue;
-                        neighborIds.push(otherId);
-                    }
-                    
-                    if (!commitsAreConnected(neighborIds, [...nodeIdsToRemove, node.id])) return;
-        
-                    nodeIdsToRemove.add(node.id);
-                    changed = true;
-                }
-            });
-        }
+        addNodeIdsToRemove(prunings.merged, showConflicts ? 'conflicts' : '');
     }
     
     nodeIdsToRemove.forEach(function (nodeId) {
@@ -580,8 +596,8 @@ function renderGraph(content, options) {
                                 svgTitle.link(gitData.URL);
                                 svgTitle.attr('target', '_blank');
                                 
-                                if (gitData.info) {
-                                    svgTitle.append(Viva.Graph.svg('title').text(gitData.info));
+                                if (gitData.info || node.data.details) {
+                                    appendDetailsTitle(svgTitle, node.data, function(data) { return data.info || ''; });
                                 }
 
                                 {
@@ -645,8 +661,8 @@ function renderGraph(content, options) {
                                 svgTitle.link(gitData.URL);
                                 svgTitle.attr('target', '_blank');                                
                                 
-                                if (gitData.info) {
-                                    svgTitle.append(Viva.Graph.svg('title').text(gitData.info));
+                                if (gitData.info || node.data.details) {
+                                    appendDetailsTitle(svgTitle, node.data, function(data) { return data.info || ''; });
                                 }
 
                                 {
@@ -691,21 +707,19 @@ function renderGraph(content, options) {
                                 }
                                 
                                 var startY = 15;
-                                for (var index = 0; index < gitData.files.length; index++) {
-                                    var file = gitData.files[index];
-                                    
+                                gitData.files.forEach(function(file, index) {
                                     var svgFileLink = Viva.Graph.svg('a');
                                     svgFileLink.link(file.URL);
                                     svgFileLink.attr('target', '_blank');
                                     svgFileLink.append(Viva.Graph.svg('text').attr('x', 20).attr('y', startY).text(file.file));
                                     
-                                    if (file.diff) {
-                                        svgFileLink.append(Viva.Graph.svg('title').text(file.diff));
+                                    if (file.diff || node.data.details) {
+                                        appendDetailsTitle(svgFileLink, node.data, function(data) { return data.files[index].diff || ''; });
                                     }
                                     
                                     svgNode.append(svgFileLink);
                                     startY += 15;
-                                }
+                                });
                             }
 
                             $(svgNode).hover(function() { // mouse over
@@ -747,12 +761,13 @@ function renderGraph(content, options) {
                             svgTitle.append(svgText);
                         }
                         
-                        // tooltip
-                        {
+                        // tooltip, reviewers come from the detail shard in sharded output
+                        appendDetailsTitle(svgTitle, node.data, function(data) {
                             var text;
                             var index;
-                            for (index = 0; index < pullRequestData.reviewers.length; ++index) {
-                                var reviewer = pullRequestData.reviewers[index];
+                            var reviewers = data.reviewers || [];
+                            for (index = 0; index < reviewers.length; ++index) {
+                                var reviewer = reviewers[index];
                                 var line = reviewer.name + ' ' + (reviewer.approved ? '(✓)' : '(?)');
 
                                 if (text) {
@@ -764,11 +779,8 @@ function renderGraph(content, options) {
                                 text += line;
                             }
 
-                            var svgTooltip = Viva.Graph.svg('title')
-                                .text(pullRequestData.source + ' → ' + pullRequestData.destination + (text ? '\n' + text : ''));
-
-                            svgTitle.append(svgTooltip);
-                        }
+                            return data.source + ' → ' + data.destination + (text ? '\n' + text : '');
+                        });
                         svgNode.append(svgTitle);
                     }
 
@@ -939,22 +951,30 @@ function renderGraph(content, options) {
 
 
     // Render the graph
-    var layout = Viva.Graph.Layout.forceDirected(graph, {
-        springLength: 80,
-        springCoeff: 0.00002,
-        //dragCoeff: 0.00002,
-        gravity: -20,
-        timeStep: 20,
-        stableThreshold: 0.03
-       // dragCoeff: 0.02,
-        //gravity: 0.1
-        /*springLength: 150,
-        springCoeff: 0.0008,
-        gravity: -1.2,
-        theta: 1.8,
-        dragCoeff: 0.0002,
-        timeStep: 5*/
-    });
+    var layout;
+    if (positioned) {
+        layout = Viva.Graph.Layout.constant(graph);
+        layout.placeNode(function(node) {
+            return {'x': node.data.position.x, 'y': node.data.position.y};
+        });
+    } else {
+        layout = Viva.Graph.Layout.forceDirected(graph, {
+            springLength: 80,
+            springCoeff: 0.00002,
+            //dragCoeff: 0.00002,
+            gravity: -20,
+            timeStep: 20,
+            stableThreshold: 0.03
+           // dragCoeff: 0.02,
+            //gravity: 0.1
+            /*springLength: 150,
+            springCoeff: 0.0008,
+            gravity: -1.2,
+            theta: 1.8,
+            dragCoeff: 0.0002,
+            timeStep: 5*/
+        });
+    }
 
     var renderer = Viva.Graph.View.renderer(graph, {
         graphics: graphics,
@@ -2,31 +2,84 @@
 # -*- coding: utf-8 -*-
 
 import json
+import gzip
+import os
+import collections
+import hashlib
+import metrics
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 def enum(**enums):
     return type('Enum', (), enums)
     
-def setToList(object):
-    if type(object) is list:
-        result = []
-        for item in object:
-            result.append(setToList(item))
-        return result
-        
-    if type(object) is dict:
-        result = {}
-        for key, value in object.items():
-            result[key] = setToList(value)
-        return result
-        
-    if type(object) is set:
-        result = []
-        for value in object:
-            result.append(setToList(value))
-        return result
-        
-    return object
+# splits object into (remaining, details) along paths of keys, lists are descended
+# item by item so that the details keep the positions of their items
+def splitDetails(object, paths):
+    remaining = dict(object)
+    details = {}
+    keys = set(path[0] for path in paths)
+    for key in keys:
+        if not key in object:
+            continue
+        subpaths = [path[1:] for path in paths if path[0] == key]
+        value = object[key]
+        if () in subpaths:
+            details[key] = remaining.pop(key)
+        elif type(value) is list:
+            parts = [splitDetails(item, subpaths) if type(item) is dict else (item, {}) for item in value]
+            remaining[key] = [part[0] for part in parts]
+            if any(part[1] for part in parts):
+                details[key] = [part[1] for part in parts]
+        elif type(value) is dict:
+            remaining[key], subdetails = splitDetails(value, subpaths)
+            if subdetails:
+                details[key] = subdetails
+    return remaining, details
+    
+# encodes sets as lists while serializing, without copying the data first
+class GraphEncoder(json.JSONEncoder):
+    def default(self, object):
+        if type(object) is set:
+            return list(object)
+        return json.JSONEncoder.default(self, object)
         
+# writes UTF-8 text to a file and to its pre-compressed siblings at once
+class OutputWriter:
+    def __init__(self, filePath, compressions=()):
+        self.files = [open(filePath, 'wb')]
+        self.compressor = None
+        self.size = 0
+        for compression in compressions:
+            if compression == 'gz':
+                self.files.append(gzip.open(filePath + '.gz', 'wb'))
+            elif compression == 'br':
+                if brotli is None:
+                    raise GraphError('brotli module not available for: ' + filePath + '.br')
+                self.compressor = brotli.Compressor()
+                self.compressorFile = open(filePath + '.br', 'wb')
+            else:
+                raise GraphError('Unknown compression: ' + compression)
+                
+    def write(self, text):
+        if not isinstance(text, bytes):
+            text = text.encode('utf-8')
+        self.size += len(text)
+        for outfile in self.files:
+            outfile.write(text)
+        if self.compressor:
+            self.compressorFile.write(self.compressor.process(text))
+            
+    def close(self):
+        metrics.add('bytesWritten', self.size)
+        for outfile in self.files:
+            outfile.close()
+        if self.compressor:
+            self.compressorFile.write(self.compressor.finish())
+            self.compressorFile.close()
+    
     
 class GraphError(Exception):
     def __init__(self, value):
@@ -35,46 +88,52 @@ class GraphError(Exception):
         return repr(self.value)
 
 
-class Node:
+class Node(object):
+    __slots__ = ('id', '_type', 'data', 'position')
+    
     Type = enum(JIRA='JIRA', GIT='git', STASH='stash')
+    
+    # fields the renderer relies on, checked without walking the data
+    requiredFields = {
+        Type.JIRA: ('type', 'URL', 'code', 'summary', 'assignee', 'status', 'statusColor', 'completed', 'estimated'),
+        Type.GIT: ('type',),
+        Type.STASH: ('reviewers', 'name', 'URL')
+        }
+    
+    # fields not needed for filtering and drawing, moved to detail shards in sharded output
+    detailFields = {
+        Type.JIRA: [('pullRequests', 'reviewers')],
+        Type.GIT: [('info',), ('files', 'diff')],
+        Type.STASH: [('reviewers',)]
+        }
+    
     def __init__(self, id, _type, data):
         self.id = id
         self._type = _type
         self.data = data
+        self.position = None # (x, y) from layout.py
         
-        if not (_type == Node.Type.JIRA or _type == Node.Type.GIT or _type == Node.Type.STASH):
+        if not _type in Node.requiredFields:
             raise GraphError('Invalid node type: ' + _type)
         
-        if _type == Node.Type.JIRA:
-            if ((not 'type' in data)
-                or (not 'URL' in data)
-                or (not 'code' in data)
-                or (not 'summary' in data)
-                or (not 'assignee' in data)
-                or (not 'status' in data)
-                or (not 'statusColor' in data)
-                or (not 'completed' in data)
-                or (not 'estimated' in data)):
-                    raise GraphError('Missing field in JIRA data node: ' + json.dumps(data, indent=4))
-                    
-        if _type == Node.Type.GIT:
-            if (not 'type' in data):
-                    raise GraphError('Missing field in git data node: ' + json.dumps(data, indent=4))
-                    
-        if _type == Node.Type.STASH:
-            if ((not 'reviewers' in data)
-                or (not 'name' in data)
-                or (not 'URL' in data)):
-                    raise GraphError('Missing field in stash data node: ' + json.dumps(data, indent=4))
+        for field in Node.requiredFields[_type]:
+            if not field in data:
+                raise GraphError('Missing field ' + field + ' in ' + _type + ' data node: ' + id)
                     
+    # sets in data are left to GraphEncoder
     def toObject(self):
-        return {
+        object = {
             'id': self.id,
             'type': self._type,
-            'data': setToList(self.data)
+            'data': self.data
             }
+        if self.position:
+            object['position'] = {'x': self.position[0], 'y': self.position[1]}
+        return object
 
-class Edge:
+class Edge(object):
+    __slots__ = ('source', 'target', '_type')
+    
     def __init__(self, source, target, _type=None):
         self.source = source
         self.target = target
@@ -83,58 +142,179 @@ class Edge:
         if source == target:
             raise GraphError('Invalid edge - source and target same: ' + source)
         
+    # edges with the same key are duplicates
+    def key(self):
+        return (self.source, self.target, self._type)
+        
     def toObject(self):
         object = {
             'source': self.source,
             'target': self.target
             }
         if self._type:
-            object['type'] = setToList(self._type)
+            object['type'] = self._type
         return object
         
+# nodes and edges in insertion order; an edge may be added before its nodes, it is
+# dangling (left out of the queries and of the output) until both of them are in the graph
 class Graph:
     def __init__(self):
-        self.nodes = []
-        self.nodeIds = set()
-        self.edges = []
+        self.nodes = collections.OrderedDict() # id: Node
+        self.edges = collections.OrderedDict() # Edge.key(): Edge
+        self.outEdges = {} # id: {Edge.key(): Edge}, dangling edges included
+        self.inEdges = {}
 
     def hasNode(self, nodeId):
-        return nodeId in self.nodeIds
+        return nodeId in self.nodes
+        
+    def getNode(self, nodeId):
+        return self.nodes[nodeId]
         
     def addNode(self, node):
         if not isinstance(node, Node):
             raise GraphError('Not a node object: ' + repr(node))
             
-        if node.id in self.nodeIds:
+        if node.id in self.nodes:
             raise GraphError('Node already added to graph: ' + node.id)
                 
-        self.nodes.append(node)
-        self.nodeIds.add(node.id)
+        self.nodes[node.id] = node
+        
+    # removes the node with all its edges
+    def removeNode(self, nodeId):
+        if not nodeId in self.nodes:
+            raise GraphError('Node not in graph: ' + nodeId)
+            
+        for edges in (self.outEdges.pop(nodeId, {}), self.inEdges.pop(nodeId, {})):
+            for key, edge in edges.items():
+                self.edges.pop(key, None)
+                self.outEdges.get(edge.source, {}).pop(key, None)
+                self.inEdges.get(edge.target, {}).pop(key, None)
+        del self.nodes[nodeId]
         
+    # returns False when the same edge is already in the graph
     def addEdge(self, edge):
         if not isinstance(edge, Edge):
             raise GraphError('Not a edge object: ' + repr(edge))
-        self.edges.append(edge)
+            
+        key = edge.key()
+        if key in self.edges:
+            return False
+            
+        self.edges[key] = edge
+        self.outEdges.setdefault(edge.source, {})[key] = edge
+        self.inEdges.setdefault(edge.target, {})[key] = edge
+        return True
+        
+    def hasEdge(self, source, target, _type=None):
+        return (source, target, _type) in self.edges
+        
+    def removeEdge(self, edge):
+        key = edge.key()
+        del self.edges[key]
+        del self.outEdges[edge.source][key]
+        del self.inEdges[edge.target][key]
+        
+    # True when both nodes of edge are in the graph
+    def isLinked(self, edge):
+        return (edge.source in self.nodes) and (edge.target in self.nodes)
+        
+    def getOutEdges(self, nodeId):
+        return [edge for edge in self.outEdges.get(nodeId, {}).values() if edge.target in self.nodes]
+        
+    def getInEdges(self, nodeId):
+        return [edge for edge in self.inEdges.get(nodeId, {}).values() if edge.source in self.nodes]
+        
+    def getSuccessors(self, nodeId):
+        return set(edge.target for edge in self.getOutEdges(nodeId))
+        
+    def getPredecessors(self, nodeId):
+        return set(edge.source for edge in self.getInEdges(nodeId))
         
-    def saveGraphJson(self, filePath, additionalData=None):
+    def getNeighbors(self, nodeId):
+        return self.getSuccessors(nodeId) | self.getPredecessors(nodeId)
+        
+    def getOutDegree(self, nodeId):
+        return len(self.getOutEdges(nodeId))
+        
+    def getInDegree(self, nodeId):
+        return len(self.getInEdges(nodeId))
+        
+    def getDegree(self, nodeId):
+        return self.getOutDegree(nodeId) + self.getInDegree(nodeId)
+        
+    # streams the graph to filePath node by node; compact drops the indentation,
+    # compressions ('gz', 'br') also writes pre-compressed siblings; shardDirectory (relative
+    # to filePath) moves Node.detailFields to one <nodeId>.json per node, referenced by the
+    # 'details' field of the node; returns the size written to filePath
+    def saveGraphJson(self, filePath, additionalData=None, compact=False, compressions=(), shardDirectory=None):
         import datetime
         
         output = {
-            'nodes': [],
-            'edges': [],
             'timestamp': datetime.datetime.now().strftime('%d.%m.%Y %X')
             }
             
         if additionalData:
             for key, value in additionalData.items():
                 output[key] = value
+                
+        if compact:
+            encoder = GraphEncoder(ensure_ascii=False, separators=(',', ':'))
+            newline = ''
+            colon = ':'
+            keyIndent = ''
+            itemIndent = ''
+        else:
+            encoder = GraphEncoder(ensure_ascii=False, indent=4)
+            newline = '\n'
+            colon = ': '
+            keyIndent = '\n' + ' ' * 4
+            itemIndent = '\n' + ' ' * 8
+            
+        def encode(object, indent):
+            return encoder.encode(object).replace('\n', indent)
             
-        for node in self.nodes:
-            output['nodes'].append(node.toObject())
+        if shardDirectory:
+            shardPath = os.path.join(os.path.dirname(filePath), shardDirectory)
+            if not os.path.exists(shardPath):
+                os.makedirs(shardPath)
                 
-        for edge in self.edges:
-            if (edge.source in self.nodeIds) and (edge.target in self.nodeIds):
-                output['edges'].append(edge.toObject())
+        def nodeObject(node):
+            object = node.toObject()
+            if not shardDirectory:
+                return object
+            object['data'], details = splitDetails(node.data, Node.detailFields[node._type])
+            if details:
+                text = encoder.encode(details)
+                if not isinstance(text, bytes):
+                    text = text.encode('utf-8')
+                shardWriter = OutputWriter(os.path.join(shardPath, node.id + '.json'))
+                try:
+                    shardWriter.write(text)
+                finally:
+                    shardWriter.close()
+                # the version query changes the node whenever its details change
+                object['details'] = shardDirectory + '/' + node.id + '.json?' + hashlib.md5(text).hexdigest()[:8]
+            return object
+            
+        writer = OutputWriter(filePath, compressions)
+        try:
+            writer.write('{' + keyIndent + '"nodes"' + colon + '[')
+            separator = itemIndent
+            for node in self.nodes.values():
+                writer.write(separator + encode(nodeObject(node), itemIndent))
+                separator = ',' + itemIndent
                 
-        with open(filePath, 'w') as outfile:
-            outfile.write(json.dumps(output, indent=4, ensure_ascii=False).encode('utf-8'))
\ No newline at end of file
+            writer.write(keyIndent + '],' + keyIndent + '"edges"' + colon + '[')
+            separator = itemIndent
+            for edge in self.edges.values():
+                if self.isLinked(edge):
+                    writer.write(separator + encode(edge.toObject(), itemIndent))
+                    separator = ',' + itemIndent
+                    
+            writer.write(keyIndent + ']')
+            for key, value in output.items():
+                writer.write(',' + keyIndent + encoder.encode(key) + colon + encode(value, keyIndent))
+            writer.write(newline + '}')
+        finally:
+            writer.close()
+        return writer.size
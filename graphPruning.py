@@ -0,0 +1,153 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# node removals of the graph.js view options, computed once per run on a graph.Graph
+# with the same rules graph.js used to apply on every load and checkbox toggle
+
+import graph
+
+# levels followed by the recursive isInactiveIssue of graph.js
+inactiveIssueDepth = 20
+
+# node ids to remove keyed by the enabled options they depend on:
+# 'inactive' when 'JIRA-all' is off, 'merged' when 'merged' is off
+def getPrunings(g):
+    return {
+        'inactive': {
+            'branches': getInactiveIssues(g, set(['JIRA', 'branches'])),
+            '': getInactiveIssues(g, set(['JIRA']))
+            },
+        'merged': {
+            'conflicts': getMergedBranches(g, set(['branches', 'conflicts'])),
+            '': getMergedBranches(g, set(['branches']))
+            }
+        }
+
+# the node filter of graph.js renderGraph
+def isDisplayed(node, options):
+    if node._type == graph.Node.Type.JIRA:
+        return 'JIRA' in options
+    if node._type == graph.Node.Type.GIT:
+        return ('branches' in options) and (node.data['type'] != 'conflict' or 'conflicts' in options)
+    return 'pull' in options
+
+def isCommit(node):
+    return node._type == graph.Node.Type.GIT and node.data['type'] != 'conflict'
+
+def isIssueDone(data):
+    return data.get('done') or data['status'] == 'Done'
+
+# JIRA issues that are done or open, have no open pull request and, when they have branches or subtasks,
+# no active branch and no linked inactive issue; the recursion of graph.js is evaluated level by level,
+# the incoming links (which graph.js follows back to the issue itself) included
+def getInactiveIssues(g, options):
+    issues = [node for node in g.nodes.values() if node._type == graph.Node.Type.JIRA and isDisplayed(node, options)]
+
+    candidates = []
+    for node in issues:
+        data = node.data
+        if not (isIssueDone(data) or data['status'] == 'Open'):
+            continue
+        if any(pullRequest['status'] == 'OPEN' for pullRequest in data.get('pullRequests', [])):
+            continue
+        candidates.append(node.id)
+
+    # issue id: (linked issue ids, has incoming link), None when the issue has no branches or subtasks
+    links = {}
+    for nodeId in candidates:
+        data = g.getNode(nodeId).data
+        if not ('branches' in data or 'subtasks' in data):
+            links[nodeId] = None
+            continue
+
+        active = False
+        targets = []
+        for edge in g.getOutEdges(nodeId):
+            target = g.getNode(edge.target)
+            if not isDisplayed(target, options):
+                continue
+            if target._type == graph.Node.Type.JIRA:
+                targets.append(target.id)
+            elif target._type == graph.Node.Type.GIT and not target.data.get('inMaster') and not target.data.get('master'):
+                active = True
+        if active:
+            continue
+        incoming = any(isDisplayed(g.getNode(edge.source), options) for edge in g.getInEdges(nodeId))
+        links[nodeId] = (targets, incoming)
+
+    inactive = set()
+    for level in range(inactiveIssueDepth, -1, -1):
+        nextInactive = set()
+        for nodeId, nodeLinks in links.items():
+            if nodeLinks is None:
+                nextInactive.add(nodeId)
+                continue
+            targets, incoming = nodeLinks
+            if incoming and nodeId in inactive:
+                continue
+            if any(target in inactive for target in targets):
+                continue
+            nextInactive.add(nodeId)
+        inactive = nextInactive
+
+    return [node.id for node in issues if node.id in inactive]
+
+# whether all targetIds are reached from startId through displayed commits which are not in omitIds,
+# the search stops once they are
+def reachesAll(g, startId, targetIds, omitIds, options, directed):
+    remaining = set(targetIds)
+    reached = set()
+    stack = [startId]
+    while stack and remaining:
+        nodeId = stack.pop()
+        neighborIds = g.getSuccessors(nodeId) if directed else g.getNeighbors(nodeId)
+        for neighborId in neighborIds:
+            if neighborId in reached or neighborId in omitIds:
+                continue
+            neighbor = g.getNode(neighborId)
+            if not (isCommit(neighbor) and isDisplayed(neighbor, options)):
+                continue
+            reached.add(neighborId)
+            remaining.discard(neighborId)
+            stack.append(neighborId)
+    return not remaining
+
+# whether graph.js would remove the merged commit nodeId once the nodes in removed are gone: none of its git
+# predecessors loses the path to any of its git successors and its neighboring commits stay connected
+def isMergedRemovable(g, nodeId, removed, options):
+    omitIds = removed | set([nodeId])
+    
+    targetIds = set(otherId for otherId in g.getSuccessors(nodeId)
+                    if not otherId in removed and g.getNode(otherId)._type == graph.Node.Type.GIT and isDisplayed(g.getNode(otherId), options))
+    sourceIds = set(otherId for otherId in g.getPredecessors(nodeId)
+                    if not otherId in removed and g.getNode(otherId)._type == graph.Node.Type.GIT and isDisplayed(g.getNode(otherId), options))
+    if targetIds and any(not reachesAll(g, sourceId, targetIds, omitIds, options, True) for sourceId in sourceIds):
+        return False
+        
+    neighborIds = [otherId for otherId in g.getNeighbors(nodeId)
+                   if not otherId in removed and isCommit(g.getNode(otherId)) and isDisplayed(g.getNode(otherId), options)]
+    if len(neighborIds) > 1 and not reachesAll(g, neighborIds[0], neighborIds[1:], omitIds, options, False):
+        return False
+    return True
+
+# the "hide merged branches" fixed point of graph.js: a commit merged to master is removed, in node order
+# and until nothing changes, unless some of its git predecessors would lose the path to some of its
+# git successors, or its neighboring commits would get disconnected; the paths only get fewer as commits
+# are removed, so a kept commit is checked again only after one of its neighbors was removed, which
+# gives the same result as the repeated passes of graph.js with one check per commit and removal
+def getMergedBranches(g, options):
+    commits = [node for node in g.nodes.values() if isCommit(node) and isDisplayed(node, options) and node.data.get('inMaster')]
+    
+    removed = set()
+    commitIds = set(node.id for node in commits)
+    pending = set(commitIds)
+    while pending:
+        for node in commits:
+            if (node.id in removed) or (not node.id in pending):
+                continue
+            pending.discard(node.id)
+            if isMergedRemovable(g, node.id, removed, options):
+                removed.add(node.id)
+                pending.update(commitIds.intersection(g.getNeighbors(node.id)) - removed)
+                
+    return [node.id for node in commits if node.id in removed]
@@ -0,0 +1,235 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# HTTP server of the wallboard: static files of a directory, the published graph documents
+# (data.json) from memory with ETag and gzip, and their changes pushed as Server-Sent Events
+# on the document path + '.events'
+
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import threading
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import unquote
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import unquote
+
+# one published document: its JSON body, gzipped body, ETag and the deltas of the last builds
+class Document:
+    historySize = 10
+    
+    def __init__(self):
+        self.content = None
+        self.body = None
+        self.gzipBody = None
+        self.etag = None
+        self.deltas = [] # [(base etag, etag, delta JSON)]
+        
+    # takes a new build of the document, returns False when nothing changed
+    def update(self, body):
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if etag == self.etag:
+            return False
+            
+        content = json.loads(body.decode('utf-8'))
+        if self.content is not None:
+            delta = getDelta(self.content, content)
+            delta.update({'base': self.etag, 'etag': etag})
+            self.deltas = (self.deltas + [(self.etag, etag, json.dumps(delta, separators=(',', ':')))])[-self.historySize:]
+            
+        buffer = io.BytesIO()
+        compressor = gzip.GzipFile(fileobj=buffer, mode='wb')
+        compressor.write(body)
+        compressor.close()
+        
+        self.content = content
+        self.body = body
+        self.gzipBody = buffer.getvalue()
+        self.etag = etag
+        return True
+        
+    # the delta JSONs leading from etag to the current document, None when they are not kept anymore
+    def getDeltasSince(self, etag):
+        if etag == self.etag:
+            return []
+        for index, (base, target, delta) in enumerate(self.deltas):
+            if base == etag:
+                return [delta for base, target, delta in self.deltas[index:]]
+        return None
+
+# nodes, edges and other fields of current which differ from previous; nodes are matched by id,
+# edges by source, target and type, 'nodes' lists the added and changed nodes
+def getDelta(previous, current):
+    previousNodes = dict((node['id'], node) for node in previous['nodes'])
+    currentIds = set(node['id'] for node in current['nodes'])
+    edgeKey = lambda edge: (edge['source'], edge['target'], edge.get('type'))
+    previousEdges = set(edgeKey(edge) for edge in previous['edges'])
+    currentEdges = set(edgeKey(edge) for edge in current['edges'])
+    return {
+        'nodes': [node for node in current['nodes'] if previousNodes.get(node['id']) != node],
+        'removedNodes': [node['id'] for node in previous['nodes'] if not node['id'] in currentIds],
+        'edges': [edge for edge in current['edges'] if not edgeKey(edge) in previousEdges],
+        'removedEdges': [edge for edge in previous['edges'] if not edgeKey(edge) in currentEdges],
+        'fields': dict((key, value) for key, value in current.items() if key != 'nodes' and key != 'edges' and previous.get(key) != value)
+        }
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+    
+    def do_GET(self):
+        path = posixpath.normpath(unquote(self.path.split('?')[0]))
+        graphServer = self.server.graphServer
+        if path.endswith('.events') and graphServer.hasDocument(path[:-len('.events')]):
+            self.sendEvents(path[:-len('.events')])
+        elif graphServer.hasDocument(path):
+            self.sendDocument(path)
+        else:
+            self.sendFile(path)
+            
+    # the gzipped body gets its own ETag (the plain one with -gzip), a cache revalidates either of them
+    def sendDocument(self, path):
+        body, gzipBody, etag = self.server.graphServer.getDocument(path)
+        gzipEtag = etag[:-1] + '-gzip"'
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzipBody
+        responseEtag = gzipEtag if body is gzipBody else etag
+        
+        tags = [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]
+        if set([etag, gzipEtag]).intersection(tag[2:] if tag.startswith('W/') else tag for tag in tags):
+            self.send_response(304)
+            self.send_header('ETag', responseEtag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+            
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('ETag', responseEtag)
+        self.send_header('Vary', 'Accept-Encoding')
+        if body is gzipBody:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        
+    # the files of the served directory, nothing outside of it
+    def sendFile(self, path):
+        filePath = os.path.join(self.server.graphServer.directory, *[part for part in path.split('/') if part and part != '..'])
+        if os.path.isdir(filePath):
+            filePath = os.path.join(filePath, 'index.html')
+        if not os.path.isfile(filePath):
+            self.send_error(404)
+            return
+            
+        with open(filePath, 'rb') as infile:
+            body = infile.read()
+        self.send_response(200)
+        self.send_header('Content-Type', mimetypes.guess_type(filePath)[0] or 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        
+    # 'hello' with the current ETag, then the 'delta' of every new build, or 'reload' when the client
+    # fell too far behind; comments keep the connection open between builds
+    def sendEvents(self, path):
+        graphServer = self.server.graphServer
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        
+        etag = graphServer.getDocument(path)[2]
+        try:
+            self.writeEvent('hello', json.dumps({'etag': etag}))
+            while graphServer.running:
+                deltas, current = graphServer.waitForChange(path, etag, graphServer.keepAliveInterval)
+                if deltas is None:
+                    self.writeEvent('reload', json.dumps({'etag': current}))
+                else:
+                    for delta in deltas:
+                        self.writeEvent('delta', delta)
+                    if not deltas:
+                        self.wfile.write(b': keep-alive\n\n')
+                        self.wfile.flush()
+                etag = current
+        except (IOError, OSError):
+            pass # client gone
+            
+    def writeEvent(self, event, data):
+        self.wfile.write(('event: ' + event + '\ndata: ' + data + '\n\n').encode('utf-8'))
+        self.wfile.flush()
+        
+    def log_message(self, format, *args):
+        pass
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class GraphServer:
+    keepAliveInterval = 15
+    
+    def __init__(self, directory, port=8080, host=''):
+        self.directory = directory
+        self.documents = {}
+        self.condition = threading.Condition()
+        self.running = True
+        self.server = Server((host, port), RequestHandler)
+        self.server.graphServer = self
+        self.thread = None
+        
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+        
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        
+    # serves the JSON file at filePath (e.g. written by graph.Graph.saveGraphJson) on urlPath ('/data.json'),
+    # clients listening on its events get the changes; returns False when the document did not change
+    def publish(self, urlPath, filePath):
+        with open(filePath, 'rb') as infile:
+            body = infile.read()
+        with self.condition:
+            document = self.documents.setdefault(posixpath.normpath(urlPath), Document())
+            if not document.update(body):
+                return False
+            self.condition.notify_all()
+        return True
+        
+    def hasDocument(self, path):
+        with self.condition:
+            return path in self.documents
+            
+    def getDocument(self, path):
+        with self.condition:
+            document = self.documents[path]
+            return document.body, document.gzipBody, document.etag
+            
+    # waits up to timeout seconds for a build after etag, returns (deltas since etag or None, current etag)
+    def waitForChange(self, path, etag, timeout):
+        with self.condition:
+            document = self.documents[path]
+            if document.etag == etag and self.running:
+                self.condition.wait(timeout)
+            return document.getDeltasSince(etag), document.etag
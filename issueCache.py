@@ -0,0 +1,92 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import json
+import time
+
+# on-disk store of fetched JIRA issues (with their 'updated' field and the time JIRA last confirmed them) and dev-status details
+class IssueCache:
+    def __init__(self, path, maxAge=30):
+        self.path = path
+        self.maxAge = maxAge # days since last use
+        self.hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS issues ('
+                                'key TEXT PRIMARY KEY, '
+                                'id TEXT NOT NULL, '
+                                'updated TEXT, '
+                                'data TEXT NOT NULL, '
+                                'accessed REAL NOT NULL, '
+                                'checked REAL)')
+        # caches of the single last sync time get the column, their records count as never checked
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(issues)')]
+        if not 'checked' in columns:
+            self.connection.execute('ALTER TABLE issues ADD COLUMN checked REAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS details ('
+                                'id TEXT PRIMARY KEY, '
+                                'data TEXT NOT NULL, '
+                                'fetched REAL NOT NULL, '
+                                'accessed REAL NOT NULL)')
+        self.connection.commit()
+
+    # returns {key: (checked, issueData)} for the cached keys, checked being the time of the request
+    # that last fetched the record or found it unchanged; records never checked are misses
+    def getIssues(self, keys):
+        issues = {}
+        now = time.time()
+        for key in keys:
+            row = self.connection.execute('SELECT checked, data FROM issues WHERE key = ?', (key,)).fetchone()
+            if (row is None) or (row[0] is None):
+                self.misses += 1
+                continue
+            self.hits += 1
+            self.connection.execute('UPDATE issues SET accessed = ? WHERE key = ?', (now, key))
+            issues[key] = (row[0], json.loads(row[1]))
+        return issues
+
+    # checked is the time the request of issueData was issued
+    def putIssue(self, issueData, checked):
+        self.connection.execute('INSERT OR REPLACE INTO issues (key, id, updated, data, accessed, checked) VALUES (?, ?, ?, ?, ?, ?)',
+                                (issueData['key'], issueData['id'], issueData['fields'].get('updated'), json.dumps(issueData), time.time(), checked))
+
+    # records of keys found unchanged by a request issued at checked
+    def setChecked(self, keys, checked):
+        self.connection.executemany('UPDATE issues SET checked = ? WHERE key = ?', [(checked, key) for key in keys])
+
+    # dev-status details have no 'updated' field, they are reused for ttl seconds
+    def getDetails(self, issueId, ttl):
+        now = time.time()
+        row = self.connection.execute('SELECT data FROM details WHERE id = ? AND fetched >= ?', (issueId, now - ttl)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute('UPDATE details SET accessed = ? WHERE id = ?', (now, issueId))
+        return json.loads(row[0])
+
+    def putDetails(self, issueId, issueDetails):
+        now = time.time()
+        self.connection.execute('INSERT OR REPLACE INTO details (id, data, fetched, accessed) VALUES (?, ?, ?, ?)',
+                                (issueId, json.dumps(issueDetails), now, now))
+
+    # drops records unused for maxAge days
+    def evict(self):
+        limit = time.time() - self.maxAge * 24 * 3600
+        self.connection.execute('DELETE FROM issues WHERE accessed < ?', (limit,))
+        self.connection.execute('DELETE FROM details WHERE accessed < ?', (limit,))
+        self.connection.commit()
+
+    def statistics(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'issues': self.connection.execute('SELECT COUNT(*) FROM issues').fetchone()[0],
+            'details': self.connection.execute('SELECT COUNT(*) FROM details').fetchone()[0]
+            }
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,53 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# parsed issues of one run indexed by id and by key, with the keys already
+# requested from JIRA, so that every issue is fetched and parsed only once
+class IssueRegistry:
+    def __init__(self):
+        self.issues = {}
+        self.keyIds = {}
+        self.errors = {}
+        self.requested = set()
+
+    # marks key as fetched or in flight, returns False when it already was
+    def request(self, key):
+        if key in self.requested:
+            return False
+        self.requested.add(key)
+        return True
+
+    # key is the requested key when it differs from the issue code (moved issues)
+    def add(self, id, issue, key=None):
+        self.issues[id] = issue
+        self.keyIds[issue['code']] = id
+        if key:
+            self.keyIds[key] = id
+
+    # remembers why key could not be parsed
+    def fail(self, key, error):
+        self.errors[key] = error
+
+    def getError(self, key):
+        return self.errors.get(key)
+
+    def has(self, id):
+        return id in self.issues
+
+    def hasKey(self, key):
+        return key in self.keyIds
+
+    def get(self, id):
+        return self.issues[id]
+
+    def getId(self, key):
+        return self.keyIds[key]
+
+    def getByKey(self, key):
+        return self.issues[self.keyIds[key]]
+
+    def items(self):
+        return self.issues.items()
+
+    def __len__(self):
+        return len(self.issues)
@@ -3,12 +3,29 @@
 
 import requests
 import json
+import metrics
+import time
+import re
+from multiprocessing.pool import ThreadPool
+try:
+    from urllib import quote
+except ImportError:
+    from urllib.parse import quote
 
 class JIRA:
-    def __init__(self, url='https://jira.atlassian.com', auth=None):
+    issueFields = 'issuelinks,assignee,subtasks,progress,issuetype,summary,priority,status,updated'
+    
+    def __init__(self, url='https://jira.atlassian.com', auth=None, workers=1):
         self.url = url
         self.auth = auth
+        self.workers = workers
         requests.packages.urllib3.disable_warnings()
+        
+        # one keep-alive session, with a connection for each concurrent request
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
     def getSprints(self, projectId):
         return self.get('/rest/greenhopper/latest/sprintquery/{0}'.format(projectId))
@@ -20,7 +37,19 @@ class JIRA:
         return self.get('/rest/agile/latest/board/{0}/issue?fields={1}'.format(boardId, issueFields))
     
     def getIssue(self, issueId):
-        return self.get('/rest/api/2/issue/{0}?fields=issuelinks,assignee,subtasks,progress,issuetype,summary,priority,status'.format(issueId))
+        return self.get('/rest/api/2/issue/{0}?fields={1}'.format(issueId, JIRA.issueFields))
+        
+    def search(self, jql, fields, startAt=0, maxResults=50):
+        return self.get('/rest/api/2/search?jql={0}&fields={1}&startAt={2}&maxResults={3}&validateQuery=false'.format(quote(jql), fields, startAt, maxResults))
+        
+    # all issues matching jql, following startAt/maxResults pagination
+    def searchAll(self, jql, fields, maxResults=100):
+        issues = []
+        while True:
+            result = self.search(jql, fields, len(issues), maxResults)
+            issues.extend(result['issues'])
+            if len(result['issues']) == 0 or len(issues) >= result['total']:
+                return issues
     
     def getIssueDetails(self, issueId):
         return self.get('/rest/dev-status/latest/issue/detail?issueId={0}&applicationType=stash&dataType=pullrequest'.format(issueId))
@@ -32,9 +61,28 @@ class JIRA:
         def __str__(self):
             return str(self.status_code) + ': ' + self.text
 
+    # calls function for every item with at most 'workers' requests in flight, keeps the order
+    def map(self, function, items):
+        if self.workers <= 1 or len(items) <= 1:
+            return [function(item) for item in items]
+            
+        pool = ThreadPool(min(self.workers, len(items)))
+        try:
+            return pool.map(function, items)
+        finally:
+            pool.close()
+            pool.join()
+
     def get(self, uri):
-        response = requests.get(self.url + uri, verify=False, auth=self.auth)
+        start = time.time()
+        response = self.session.get(self.url + uri, verify=False, auth=self.auth)
+        metrics.addCall('jira', self.getEndpoint(uri), time.time() - start)
+        metrics.add('jiraBytesRead', len(response.content))
         if response.status_code != 200:
             raise self.JIRAError(response.status_code, response.text)
             
-        return json.loads(response.text)
\ No newline at end of file
+        return json.loads(response.text)
+        
+    # uri without the query and with ids and issue keys (not the api version) as {id}, e.g. '/rest/api/2/issue/{id}'
+    def getEndpoint(self, uri):
+        return re.sub('(?<!/api)/([A-Z][A-Z0-9]*-)?[0-9]+(?=/|$)', '/{id}', uri.split('?')[0])
@@ -0,0 +1,85 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class LayoutError(Exception):
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+# force-directed (Fruchterman-Reingold) layout of a graph.Graph, vectorized over all node pairs;
+# nodes start from their previousPositions ({nodeId: (x, y)}) and may move only as far as the share
+# of new nodes requires, so that a mostly unchanged graph keeps its picture;
+# sets Node.position and returns {nodeId: (x, y)}
+def computeLayout(g, previousPositions=None, iterations=200, distance=120.0, gravity=0.02, seed=0):
+    if numpy is None:
+        raise LayoutError('numpy module not available')
+
+    ids = list(g.nodes)
+    if not ids:
+        return {}
+    index = dict((id, position) for position, id in enumerate(ids))
+    edges = [(index[edge.source], index[edge.target]) for edge in g.edges.values() if g.isLinked(edge)]
+    sources = numpy.array([edge[0] for edge in edges], dtype=int)
+    targets = numpy.array([edge[1] for edge in edges], dtype=int)
+
+    previousPositions = previousPositions or {}
+    positions = numpy.zeros((len(ids), 2))
+    placed = numpy.zeros(len(ids), dtype=bool)
+    for id in ids:
+        if id in previousPositions:
+            positions[index[id]] = previousPositions[id]
+            placed[index[id]] = True
+    previouslyPlaced = placed.copy()
+    newShare = 1.0 - placed.mean()
+
+    # new nodes start next to their placed neighbors, otherwise anywhere around the center
+    random = numpy.random.RandomState(seed)
+    spread = distance * math.sqrt(len(ids))
+    center = positions[placed].mean(axis=0) if placed.any() else numpy.zeros(2)
+    for id in ids:
+        if placed[index[id]]:
+            continue
+        neighbors = [index[neighbor] for neighbor in g.getNeighbors(id) if placed[index[neighbor]]]
+        if neighbors:
+            positions[index[id]] = positions[neighbors].mean(axis=0) + random.uniform(-distance, distance, 2)
+        else:
+            positions[index[id]] = center + random.uniform(-spread / 2, spread / 2, 2)
+        placed[index[id]] = True
+
+    # new nodes move freely, the others only as much as the share of new nodes requires
+    temperature = numpy.where(previouslyPlaced, spread / 10 * newShare, spread / 10)
+    cooling = temperature / iterations
+    for iteration in range(iterations):
+        # repulsion distance^2/d between pairs closer than 3 * distance, attraction d^2/distance along the edges
+        delta = positions[:, numpy.newaxis, :] - positions[numpy.newaxis, :, :]
+        length = numpy.maximum(numpy.sqrt((delta ** 2).sum(axis=2)), 0.01)
+        repulsion = numpy.where(length < 3 * distance, distance ** 2 / length ** 2, 0.0)
+        displacement = (delta * repulsion[:, :, numpy.newaxis]).sum(axis=1)
+
+        if edges:
+            edgeDelta = positions[sources] - positions[targets]
+            edgeLength = numpy.sqrt((edgeDelta ** 2).sum(axis=1))
+            pull = edgeDelta * (edgeLength / distance)[:, numpy.newaxis]
+            numpy.subtract.at(displacement, sources, pull)
+            numpy.add.at(displacement, targets, pull)
+
+        # keeps the unconnected parts together
+        displacement -= (positions - positions.mean(axis=0)) * gravity
+
+        length = numpy.maximum(numpy.sqrt((displacement ** 2).sum(axis=1)), 0.01)
+        positions += displacement * (numpy.minimum(length, temperature) / length)[:, numpy.newaxis]
+        temperature -= cooling
+
+    result = {}
+    for id in ids:
+        position = (round(float(positions[index[id]][0]), 1), round(float(positions[index[id]][1]), 1))
+        g.getNode(id).position = position
+        result[id] = position
+    return result
@@ -1,12 +1,25 @@
-#!/usr/bin/env python
+﻿#!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
 import jira
 import graph
 import gitGraph
 import git
+import conflictCache
+import issueCache
+import issueRegistry
+import graphPruning
+import layout
+import metrics
 import os
 import shutil
+import time
+import copy
+import json
+import hashlib
+import re
+import cProfile
+from multiprocessing.pool import ThreadPool
     
 class LogicError(Exception):
     def __init__(self, value):
@@ -30,51 +43,245 @@ class Logic:
                                     'url': 'https://stash.atlassian.com/commit/'
                                     }
                               }):
-        self.jira = jira.JIRA(url=config['jira']['url'], auth=config['jira']['auth'])
+        self.jira = jira.JIRA(url=config['jira']['url'], auth=config['jira']['auth'], workers=config['jira'].get('workers', 1))
         self.config = config
+        self.gitRepository = None
+        self.mergeEngine = None
         
-    def createGraph(self, jiraBoardId, filePath, masterBranches=[], additionalBranches=[]):
+    # shared repository object, so pooled git processes live for the whole run
+    def getGitRepository(self):
+        if not self.gitRepository:
+            self.gitRepository = self.createGitRepository(self.config['git']['repository'], self.config['git'].get('pooled', False))
+        return self.gitRepository
         
-        issues = self.parseActiveSprintIssues(jiraBoardId)
+    def createGitRepository(self, path, pooled=False):
+        return git.GIT(path, self.config['git'].get('executable', 'git.exe'), pooled=pooled)
         
-        codeIdMap = {}
+    # builds the graph and writes it to filePath; returns the state to pass as previousState
+    # to the next call, which then only recomputes what changed and skips writing entirely
+    # when neither the issues nor the branch tips moved (the returned state has 'skipped' set);
+    # with config['metrics'] ({'fileName', 'profile'}) the phase timings and call counts of the run
+    # are written next to filePath, together with a cProfile dump when 'profile' names its file
+    def createGraph(self, jiraBoardId, filePath, masterBranches=[], additionalBranches=[], fullRefresh=False, previousState=None):
+        target = {
+            'board': jiraBoardId,
+            'filePath': filePath,
+            'masterBranches': masterBranches,
+            'additionalBranches': additionalBranches
+            }
+        return self.createGraphs([target], fullRefresh, [previousState])[0]
+        
+    # createGraph for several targets ({'board', 'filePath', 'masterBranches', 'additionalBranches'})
+    # over the same repository: the boards are fetched together, the git graph of all their branches
+    # is built and every branch pair is merged once, then each target gets its graph from that shared
+    # state; returns the states of the targets in their order, previousStates are the ones returned before;
+    # with changes ({'issues': keys, 'branches': names, 'links': names, 'full': bool}, see webhooks.py)
+    # the boards are not fetched again: only the changed issues are, together with the issues linked
+    # to the 'links' branches, and only the moved branches are fetched from the repository
+    def createGraphs(self, targets, fullRefresh=False, previousStates=None, changes=None):
+        metrics.current.clear()
+        metricsConfig = self.config.get('metrics')
+        outputDirs = []
+        for target in targets:
+            outputDir = os.path.dirname(os.path.abspath(target['filePath']))
+            if not outputDir in outputDirs:
+                outputDirs.append(outputDir)
+        profile = cProfile.Profile() if (metricsConfig and metricsConfig.get('profile')) else None
+        try:
+            with metrics.span('createGraph'):
+                if profile:
+                    return profile.runcall(self.buildGraphs, targets, fullRefresh, previousStates, changes)
+                return self.buildGraphs(targets, fullRefresh, previousStates, changes)
+        finally:
+            print('Timing: ' + metrics.current.summary())
+            for outputDir in outputDirs:
+                if profile:
+                    profile.dump_stats(os.path.join(outputDir, metricsConfig['profile']))
+                if metricsConfig is not None:
+                    metrics.current.save(os.path.join(outputDir, metricsConfig.get('fileName', 'metrics.json')))
+                
+    def buildGraphs(self, targets, fullRefresh=False, previousStates=None, changes=None):
+        if previousStates is None:
+            previousStates = [None] * len(targets)
+        previousStates = [previousState or {} for previousState in previousStates]
+        jiraBoardIds = [target['board'] for target in targets]
+        fetched = None
+        if changes is not None:
+            fetched = self.refetchIssues(jiraBoardIds, previousStates, changes)
+        fetchNames = None
+        if fetched is None:
+            fetched = self.fetchBoardsIssues(jiraBoardIds, fullRefresh)
+        else:
+            fetchNames = set(changes.get('branches', []))
+        boardsIssues = self.parseFetchedIssues(fetched)
+        
+        # one fetch of the branches of all targets; after changes only of the moved ones and of those not seen before
+        targetsBranches = [self.getIssueBranches(issues, target['masterBranches'], target['additionalBranches']) for target, issues in zip(targets, boardsIssues)]
+        names = set()
+        for branches, refNames, issueHashes in targetsBranches:
+            names.update(refNames | set(branches.keys()))
+        if fetchNames is None:
+            fetchNames = names
+        else:
+            knownNames = set()
+            for previousState in previousStates:
+                knownNames.update(previousState['refs'].keys())
+            fetchNames = (fetchNames & names) | (names - knownNames)
+        gitRepository = self.getGitRepository()
+        if fetchNames:
+            with metrics.span('repositoryUpdate'):
+                self.updateRepository(fetchNames)
+        snapshot = gitRepository.getRefSnapshot()
+        
+        states = []
+        builds = []
+        for index, (target, issues, (branches, refNames, issueHashes), previousState) in enumerate(zip(targets, boardsIssues, targetsBranches, previousStates)):
+            refs = dict([(name, snapshot.getCommit('origin/' + name)) for name in refNames | set(branches.keys())])
+            # what the next run with changes starts from
+            jiraState = {
+                'board': target['board'],
+                'boardIssues': fetched[0][index],
+                'issuesData': fetched[1],
+                'issuesDetails': fetched[2]
+                }
+            state = {
+                'jira': jiraState,
+                'branches': branches,
+                'additionalBranches': list(target['additionalBranches']),
+                'refs': refs,
+                'issues': issueHashes,
+                'infos': {},
+                'distances': {},
+                'conflicts': {},
+                'positions': {},
+                'skipped': False
+                }
+            
+            if ((previousState.get('issues') == issueHashes)
+                and (previousState.get('refs') == refs)
+                and (previousState.get('branches') == branches)
+                and (previousState.get('additionalBranches') == state['additionalBranches'])):
+                previousState['skipped'] = True
+                previousState['jira'] = jiraState
+                states.append(previousState)
+                continue
+            states.append(state)
+            
+            # the git graph only depends on the branch tips
+            state['tips'] = dict([(name, refs[name]) for name in branches])
+            builds.append({
+                'target': target,
+                'issues': issues,
+                'state': state,
+                'previousState': previousState,
+                'reuse': (previousState.get('branches') == branches) and (previousState.get('tips') == state['tips'])
+                })
+            
+        # the targets with moved tips share the graph of all their branches
+        sharedGraph = None
+        staleNames = set()
+        for build in builds:
+            if not build['reuse']:
+                staleNames.update(build['state']['branches'].keys())
+        if staleNames:
+            sharedGraph = self.getGitGraph(staleNames, snapshot)
+            
+        previousInfos = {}
+        knownConflicts = {}
+        for previousState in previousStates:
+            previousInfos.update(previousState.get('infos', {}))
+            knownConflicts.update(previousState.get('conflicts', {}))
+            
+        commitIds = set()
+        for build in builds:
+            state = build['state']
+            if build['reuse']:
+                gitBranches = copy.deepcopy(build['previousState']['gitBranches'])
+                state['distances'] = build['previousState']['distances']
+            else:
+                gitBranches = self.calculateBranches(state['branches'], update=False, distances=state['distances'], snapshot=snapshot, sharedGraph=sharedGraph)
+            state['gitBranches'] = copy.deepcopy(gitBranches)
+            build['gitBranches'] = gitBranches
+            commitIds.update(branch['id'] for branch in gitBranches)
+            
+        with metrics.span('gitInfos'):
+            infos = gitRepository.getInfos([id for id in commitIds if not id in previousInfos])
+        for id in commitIds:
+            if not id in infos:
+                infos[id] = previousInfos[id]
+                
+        graphs = []
+        pairs = set()
+        for build in builds:
+            state = build['state']
+            g = graph.Graph()
+            commitsForConflictResolution = set()
+            for branch in build['gitBranches']:
+                state['infos'][branch['id']] = infos[branch['id']]
+                
+                branch.update({'type': 'branch' if (len(branch['branchNames']) != 0) else 'commit'})
+                branch.update({'URL': self.config['stash']['url'] + branch['id'] })
+                branch.update({'info': infos[branch['id']] })
+    
+                nodeId = self.getGitNodeId(branch['id'])
+                g.addNode(graph.Node(nodeId, graph.Node.Type.GIT, branch))
+                for successor in branch['successors']:
+                    distance = state['distances'][(branch['id'], successor)]
+                    g.addEdge(graph.Edge(nodeId, self.getGitNodeId(successor), distance))
+                    
+                if branch['master'] or (len(branch['successors']) == 0):
+                    commitsForConflictResolution.add(branch['id'])
+                    
+            for branch in build['target']['additionalBranches']:
+                commitsForConflictResolution.add(state['refs'][branch])
+            build['pairs'] = self.getCommitPairs(commitsForConflictResolution)
+            pairs.update(build['pairs'])
+            graphs.append(g)
+            
+        with metrics.span('conflictSearch'):
+            pairConflicts = self.getPairConflicts(sorted(pairs), knownConflicts)
+            
+        for build, g in zip(builds, graphs):
+            self.writeGraph(g, build['target'], build['issues'], build['state'], build['previousState'], build['pairs'], pairConflicts)
+        gitRepository.close()
+        return states
+        
+    # {branch: isMaster} of the branches in the repository, names of all branches referenced by the issues
+    # and pull requests of the repository and {issueId: hash} of the issues
+    def getIssueBranches(self, issues, masterBranches, additionalBranches):
         branches = {}
+        issueHashes = {}
+        refNames = set(additionalBranches)
         for id, data in issues.items():
-            codeIdMap[data['code']] = id
+            issueHashes[id] = hashlib.md5(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
             if 'branches' in data:
                 for branch in data['branches']:
+                    refNames.add(branch['name'])
                     if branch['repository'] == self.config['git']['repositoryName']:
                         branches[branch['name']] = False
+            if 'pullRequests' in data:
+                for pullRequest in data['pullRequests']:
+                    if pullRequest['repository'] == self.config['git']['repositoryName']:
+                        refNames.add(pullRequest['source'])
+                        refNames.add(pullRequest['destination'])
         
         for branch in additionalBranches:
             branches[branch] = False
             
         for branch in masterBranches:
             branches[branch] = True
-            
-          
-        g = graph.Graph()
-        gitRepository = git.GIT(self.config['git']['repository'])
-
-        commitsForConflictResolution = set()
-        for branch in self.calculateBranches(branches):
-            branch.update({'type': 'branch' if (len(branch['branchNames']) != 0) else 'commit'})
-            branch.update({'URL': self.config['stash']['url'] + branch['id'] })
-            branch.update({'info': gitRepository.getInfo(branch['id']) })
-
-            nodeId = self.getGitNodeId(branch['id'])
-            g.addNode(graph.Node(nodeId, graph.Node.Type.GIT, branch))
-            for successor in branch['successors']:
-                g.addEdge(graph.Edge(nodeId, self.getGitNodeId(successor), gitRepository.getDistance(branch['id'], successor)))
-                
-            if branch['master'] or (len(branch['successors']) == 0):
-                commitsForConflictResolution.add(branch['id'])
-                
+        return branches, refNames, issueHashes
         
-        for branch in additionalBranches:
-            commitsForConflictResolution.add(gitRepository.revParse('origin/' + branch))
-        
-        for conflict in self.findConflicts(commitsForConflictResolution, os.path.dirname(os.path.abspath(filePath))):
+    # adds the conflicts of pairs (taken from pairConflicts), the issues and pull requests to the git graph g
+    # of a target and writes it
+    def writeGraph(self, g, target, issues, state, previousState, pairs, pairConflicts):
+        filePath = target['filePath']
+        refs = state['refs']
+        for pair in pairs:
+            state['conflicts'][pair] = pairConflicts[pair]
+        with metrics.span('conflictSearch'):
+            conflicts = self.getConflictNodes(pairs, pairConflicts, os.path.dirname(os.path.abspath(filePath)))
+        for conflict in conflicts:
             nodeId = self.getConflictNodeId(conflict)
             conflict.update({'type': 'conflict'})
             g.addNode(graph.Node(nodeId, graph.Node.Type.GIT, conflict))
@@ -93,9 +300,8 @@ class Logic:
             if 'branches' in data:
                 linkedBranches = set()
                 for branch in data['branches']:
-                    try:
-                        gitId = gitRepository.revParse('origin/' + branch['name'])
-                    except git.GIT.GitError:
+                    gitId = refs[branch['name']]
+                    if gitId is None:
                         continue
                     
                     nodeId = self.getGitNodeId(gitId)
@@ -105,13 +311,13 @@ class Logic:
             
             if 'subtasks' in data:
                 for code in data['subtasks']:
-                    if code in codeIdMap:
-                        g.addEdge(graph.Edge(self.getIssueNodeId(id), self.getIssueNodeId(codeIdMap[code]), 'subtask'))
+                    if issues.hasKey(code):
+                        g.addEdge(graph.Edge(self.getIssueNodeId(id), self.getIssueNodeId(issues.getId(code)), 'subtask'))
         
             if 'links' in data:
                 for link in data['links']:
-                    if link['key'] in codeIdMap:
-                        g.addEdge(graph.Edge(self.getIssueNodeId(id), self.getIssueNodeId(codeIdMap[link['key']]), link['type']))
+                    if issues.hasKey(link['key']):
+                        g.addEdge(graph.Edge(self.getIssueNodeId(id), self.getIssueNodeId(issues.getId(link['key'])), link['type']))
                         
             if 'pullRequests' in data:
                 for pullRequest in data['pullRequests']:
@@ -122,10 +328,8 @@ class Logic:
                             
                             # Add links to source and target branch
                             if pullRequest['repository'] == self.config['git']['repositoryName']:
-                                sourceGitId = gitRepository.revParse('origin/' + pullRequest['source'])
-                                targetGitId = gitRepository.revParse('origin/' + pullRequest['destination'])
-                                sourceNodeId = self.getGitNodeId(sourceGitId)
-                                targetNodeId = self.getGitNodeId(targetGitId)
+                                sourceNodeId = self.getGitNodeId(refs[pullRequest['source']])
+                                targetNodeId = self.getGitNodeId(refs[pullRequest['destination']])
                                 if g.hasNode(sourceNodeId):
                                     g.addEdge(graph.Edge(sourceNodeId, pullRequestId))
                                 if g.hasNode(targetNodeId):
@@ -133,45 +337,56 @@ class Logic:
                                 
                         g.addEdge(graph.Edge(self.getIssueNodeId(id), pullRequestId))
                         
-        g.saveGraphJson(filePath, {'masterBranches': masterBranches, 'additionalBranches': additionalBranches})
+        output = self.config.get('output', {})
+        if output.get('layout'):
+            with metrics.span('layout'):
+                state['positions'] = layout.computeLayout(g, previousState.get('positions'))
+        with metrics.span('prunings'):
+            prunings = graphPruning.getPrunings(g)
+        with metrics.span('jsonWrite'):
+            g.saveGraphJson(filePath, {'masterBranches': target['masterBranches'], 'additionalBranches': target['additionalBranches'], 'prunings': prunings}, output.get('compact', False), output.get('compressions', []), output.get('shards'))
         
-    def calculateBranches(self, branches):
-        gitRepository = git.GIT(self.config['git']['repository'])
+    # distances, when given, is filled with the commit counts of the edges ({(commit, successor): count});
+    # snapshot (git.RefSnapshot) is taken after the fetch when not given; when sharedGraph (getGitGraph of more
+    # branches) is given, the graph of branches is built from their tips alone on its ancestry walk
+    def calculateBranches(self, branches, update=True, distances=None, snapshot=None, sharedGraph=None):
+        gitRepository = self.getGitRepository()
         
-        try:
-            gitRepository.reset()
-        except git.GIT.GitError:
-            for item in os.listdir(self.config['git']['repository']):
-                if item.startswith('.git'):
-                    continue
-                itemPath = os.path.join(self.config['git']['repository'], item)
-                if os.path.isdir(itemPath):
-                    shutil.rmtree(itemPath)
-                else:
-                    os.remove(itemPath)
-            gitRepository.reset()
-                        
-        gitRepository.fetch()
+        if update:
+            with metrics.span('repositoryUpdate'):
+                self.updateRepository(branches.keys())
+        if snapshot is None:
+            snapshot = gitRepository.getRefSnapshot()
         
-        g = gitGraph.GitGraph(gitRepository)
+        if sharedGraph is None:
+            g = self.getGitGraph(branches.keys(), snapshot)
+        else:
+            with metrics.span('gitGraphBuild'):
+                sharedGraph.walkAncestry()
+                g = sharedGraph.copy()
+                g.update(self.getTips(branches.keys(), snapshot))
+        tips = g.tips
         
         masterIds = set()
-        for name, master in branches.items():
-            remoteName = 'origin/' + name
-            g.add(remoteName)
-            if master:
-                masterIds.add(gitRepository.revParse(remoteName))
+        for name in branches:
+            if branches[name]:
+                masterIds.add(tips[name])
       
+        masterMask = g.getMask(masterIds)
+        if distances is not None:
+            with metrics.span('distances'):
+                for pair, distance in g.getDistances().items():
+                    distances[pair] = str(distance) # edge labels as 'git rev-list --count' printed them
         result = []
         for id in g.getIds():
             branchNames = []
             masterBranch = (id in masterIds)
-            for branch in gitRepository.getBranches(id):
+            for branch in snapshot.getBranches(id):
                 branchNames.append(branch.name)
             
             inMaster = ((not masterBranch)
-                        and (g.getPredecessors(id, direct=False).isdisjoint(masterIds))
-                        and (not g.getSuccessors(id, direct=False).isdisjoint(masterIds))
+                        and (g.getPredecessorMask(id) & masterMask == 0)
+                        and (g.getSuccessorMask(id) & masterMask != 0)
                         )
 
             result.append({
@@ -184,62 +399,220 @@ class Logic:
                         })
                         
         # mark nodes connecting master and non-master paths
+        nodes = {}
+        for node in result:
+            nodes[node['id']] = node
         for node in result:
             if node['inMaster']:
                 for sId in node['successors']:
-                    if not node['mergeBase']:
-                        for S in result:
-                            if S['id'] == sId and (not S['inMaster']) and (not S['master']):
-                                node['mergeBase'] = True
-                                break
+                    S = nodes[sId]
+                    if (not S['inMaster']) and (not S['master']):
+                        node['mergeBase'] = True
+                        break
                                 
         return result
         
-    # finds all conflicts among specified commits
-    def findConflicts(self, commits, outputDir):
-        gitRepository = git.GIT(self.config['git']['repository'])
-        result = []
-        for commitA in commits:
-            for commitB in commits:
+    # the gitGraph.GitGraph of the branches in names, updated from the graph of the previous run
+    # stored at config['git']['graphPath'] (saved back with the edge distances)
+    def getGitGraph(self, names, snapshot):
+        g = gitGraph.GitGraph(self.getGitRepository())
+        graphPath = self.config['git'].get('graphPath')
+        tips = self.getTips(names, snapshot)
+        with metrics.span('gitGraphBuild'):
+            if graphPath and os.path.exists(graphPath):
+                g.load(graphPath)
+            g.update(tips)
+        if graphPath:
+            with metrics.span('distances'):
+                g.getDistances()
+            g.save(graphPath)
+        return g
+        
+    # {name: commit} of the branches in names
+    def getTips(self, names, snapshot):
+        tips = {}
+        for name in names:
+            tips[name] = snapshot.getCommit('origin/' + name)
+            if tips[name] is None:
+                raise git.GIT.GitError(128, 'Unknown branch: origin/' + name)
+        return tips
+        
+    # fetches the branches in names; the 'narrow' git.fetchMode fetches only their refspecs
+    # (with git.fetchFilter, e.g. 'blob:none') and never touches a working tree, so it also
+    # works with bare and partial clones
+    def updateRepository(self, names):
+        gitRepository = self.getGitRepository()
+        if self.config['git'].get('fetchMode', 'full') == 'narrow':
+            gitRepository.fetchBranches(names, self.config['git'].get('fetchFilter'))
+        else:
+            self.resetRepository(gitRepository)
+            gitRepository.fetch()
+            
+    # the narrow fetch mode has no working tree to merge in; otherwise in-memory merges fall back
+    # to working tree ones when the git executable has no 'merge-tree --write-tree'
+    def getMergeEngine(self):
+        if self.mergeEngine is None:
+            narrow = (self.config['git'].get('fetchMode', 'full') == 'narrow')
+            mergeEngine = 'mergeTree' if narrow else self.config['git'].get('mergeEngine', 'checkout')
+            if (mergeEngine == 'mergeTree') and not self.getGitRepository().supportsMergeTree():
+                if narrow:
+                    raise LogicError('The narrow fetch mode needs git 2.38 or later (merge-tree --write-tree)')
+                print('Merge engine: git has no merge-tree --write-tree, merging in working trees')
+                mergeEngine = 'checkout'
+            self.mergeEngine = mergeEngine
+        return self.mergeEngine
+        
+    def resetRepository(self, gitRepository):
+        try:
+            gitRepository.reset()
+        except git.GIT.GitError:
+            for item in os.listdir(gitRepository.repositoryPath):
+                if item.startswith('.git'):
+                    continue
+                itemPath = os.path.join(gitRepository.repositoryPath, item)
+                if os.path.isdir(itemPath):
+                    shutil.rmtree(itemPath)
+                else:
+                    os.remove(itemPath)
+            gitRepository.reset()
+        
+    # finds all conflicts among specified commits; pairs found in knownConflicts
+    # ({(commitA, commitB): conflicts}) are reused, all results are stored to usedConflicts
+    def findConflicts(self, commits, outputDir, knownConflicts={}, usedConflicts=None):
+        pairs = self.getCommitPairs(commits)
+        pairConflicts = self.getPairConflicts(pairs, knownConflicts)
+        if usedConflicts is not None:
+            usedConflicts.update(pairConflicts)
+        return self.getConflictNodes(pairs, pairConflicts, outputDir)
+        
+    def getCommitPairs(self, commits):
+        pairs = []
+        orderedCommits = sorted(commits)
+        for commitA in orderedCommits:
+            for commitB in orderedCommits:
                 if commitA > commitB:
-                    gitRepository.checkout(commitA, force=True)
-                    try:
-                        gitRepository.merge(commitB)
-                    except git.GIT.GitError:
-                        conflict = {
-                            'commitA': commitA,
-                            'commitB': commitB,
-                            'files': self.collectConflicts(gitRepository, commitA, commitB, outputDir)
-                            }
-                        if len(conflict['files']) != 0:
-                            result.append(conflict)
-                        
-                    try:
-                        gitRepository.reset()
-                    except git.GIT.GitError:
-                        for item in os.listdir(self.config['git']['repository']):
-                            if item.startswith('.git'):
-                                continue
-                            itemPath = os.path.join(self.config['git']['repository'], item)
-                            if os.path.isdir(itemPath):
-                                shutil.rmtree(itemPath)
-                            else:
-                                os.remove(itemPath)
-                        gitRepository.reset()
-                    
+                    pairs.append((commitA, commitB))
+        return pairs
+        
+    # {(commitA, commitB): conflicts} of pairs, taken from knownConflicts or the conflict cache when there,
+    # otherwise from trial merges
+    def getPairConflicts(self, pairs, knownConflicts={}):
+        cache = self.openConflictCache()
+        
+        pairConflicts = {}
+        pendingPairs = []
+        for pair in pairs:
+            conflicts = knownConflicts.get(pair)
+            if (conflicts is None) and cache:
+                conflicts = cache.get(pair[0], pair[1])
+            if conflicts is None:
+                pendingPairs.append(pair)
+            else:
+                pairConflicts[pair] = conflicts
+                
+        for pair, conflicts in zip(pendingPairs, self.mergePairs(pendingPairs)):
+            pairConflicts[pair] = conflicts
+            if cache:
+                cache.put(pair[0], pair[1], conflicts)
+                
+        if cache:
+            cache.evict()
+            print('Conflict cache: ' + str(cache.statistics()))
+            cache.close()
+        return pairConflicts
+        
+    # conflict node data of the conflicting pairs, their diff files are written to outputDir
+    def getConflictNodes(self, pairs, pairConflicts, outputDir):
+        result = []
+        for commitA, commitB in pairs:
+            conflicts = pairConflicts[(commitA, commitB)]
+            if len(conflicts) != 0:
+                result.append({
+                    'commitA': commitA,
+                    'commitB': commitB,
+                    'files': self.collectConflicts(conflicts, commitA, commitB, outputDir)
+                    })
         return result
         
-    # creates diff files for all conflicts in the repository
-    def collectConflicts(self, gitRepository, commitA, commitB, outputDir):
+    # persistent conflict cache configured by config['conflictCache'] ({'path', 'maxEntries', 'maxAge'})
+    def openConflictCache(self):
+        if not 'conflictCache' in self.config:
+            return None
+        cacheConfig = self.config['conflictCache']
+        return conflictCache.ConflictCache(cacheConfig['path'], cacheConfig.get('maxEntries', 100000), cacheConfig.get('maxAge', 30))
+        
+    # trial merges of all pairs, spread over config['git']['conflictWorkers'] workers;
+    # returns the conflicts of each pair in the order of pairs
+    def mergePairs(self, pairs):
+        workers = min(self.config['git'].get('conflictWorkers', 1), len(pairs))
+        if workers <= 1:
+            return self.mergeChunk(self.getGitRepository(), pairs)
+            
+        repositories = [self.getWorkerRepository(index) for index in range(workers)]
+        chunks = [pairs[index::workers] for index in range(workers)]
+        
+        # the work happens in git processes, so threads are enough to keep all cores busy
+        pool = ThreadPool(workers)
+        try:
+            chunkResults = pool.map(lambda index: self.mergeChunk(repositories[index], chunks[index]), range(workers))
+        finally:
+            pool.close()
+            pool.join()
+            
+        result = [None] * len(pairs)
+        for index in range(workers):
+            result[index::workers] = chunkResults[index]
+        return result
+        
+    def mergeChunk(self, gitRepository, pairs):
+        inMemory = (self.getMergeEngine() == 'mergeTree')
+        result = []
+        for commitA, commitB in pairs:
+            if inMemory:
+                result.append(gitRepository.mergeConflicts(commitA, commitB))
+            else:
+                result.append(self.mergeInWorkingTree(gitRepository, commitA, commitB))
+        return result
+        
+    # repository for a conflict worker: in-memory merges share the main repository,
+    # working tree merges get their own 'git worktree' sharing its object store
+    def getWorkerRepository(self, index):
+        if self.getMergeEngine() == 'mergeTree':
+            return self.createGitRepository(self.config['git']['repository'])
+            
+        worktreesDir = self.config['git'].get('worktrees', self.config['git']['repository'].rstrip('/\\') + '_worktrees')
+        worktreePath = os.path.join(worktreesDir, str(index))
+        if not os.path.exists(worktreePath):
+            gitRepository = self.getGitRepository()
+            gitRepository.pruneWorktrees()
+            gitRepository.addWorktree(os.path.abspath(worktreePath))
+        return self.createGitRepository(worktreePath)
+        
+    # trial merge in the repository working tree, returns the conflicts
+    def mergeInWorkingTree(self, gitRepository, commitA, commitB):
+        conflicts = []
+        gitRepository.checkout(commitA, force=True)
+        try:
+            gitRepository.merge(commitB)
+        except git.GIT.GitError:
+            conflicts = gitRepository.conflicts()
+            
+        self.resetRepository(gitRepository)
+        return conflicts
+        
+    # creates diff files for all conflicts
+    def collectConflicts(self, conflicts, commitA, commitB, outputDir):
         conflictsDir = os.path.join(outputDir, 'conflicts')
         if not os.path.exists(conflictsDir):
             os.makedirs(conflictsDir)
     
         result = []
-        for conflict in gitRepository.conflicts():
+        for conflict in conflicts:
             fileName = commitA[:10] + '_' + commitB[:10] + '_' + conflict['file'].replace('/','_').replace('-','_') + '.diff'
+            diff = conflict['diff'].encode('utf-8')
             with open(os.path.join(conflictsDir, fileName), 'w') as outfile:
-                outfile.write(conflict['diff'].encode('utf-8'))
+                outfile.write(diff)
+            metrics.add('bytesWritten', len(diff))
                 
             result.append({
                         'file': conflict['file'],
@@ -249,13 +622,115 @@ class Logic:
             
         return result
         
-    def parseActiveSprintIssues(self, jiraBoardId):
-        issues = {}
-        for majorIssueData in self.getBoardIssues(jiraBoardId):
-            issueData = self.jira.getIssue(majorIssueData['key'])
+    # returns an issueRegistry.IssueRegistry of the board issues, their subtasks and linked issues
+    def parseActiveSprintIssues(self, jiraBoardId, fullRefresh=False):
+        return self.parseBoardsIssues([jiraBoardId], fullRefresh)[0]
+        
+    # parseActiveSprintIssues of several boards, fetched concurrently; issues on more boards are fetched once
+    def parseBoardsIssues(self, jiraBoardIds, fullRefresh=False):
+        return self.parseFetchedIssues(self.fetchBoardsIssues(jiraBoardIds, fullRefresh))
+        
+    # fetches the boards and prefetches their issues, returns ([boardIssues], {key: issueData}, {issueId: issueDetails})
+    def fetchBoardsIssues(self, jiraBoardIds, fullRefresh=False):
+        with metrics.span('boardFetch'):
+            boardsIssues = self.jira.map(self.getBoardIssues, jiraBoardIds)
+        keys = []
+        for boardIssues in boardsIssues:
+            keys.extend(majorIssueData['key'] for majorIssueData in boardIssues)
+        with metrics.span('issueFetch'):
+            issuesData, issuesDetails = self.prefetchIssues(keys, fullRefresh)
+        return boardsIssues, issuesData, issuesDetails
+        
+    # issueRegistry.IssueRegistry of each board of fetched (fetchBoardsIssues)
+    def parseFetchedIssues(self, fetched):
+        boardsIssues, issuesData, issuesDetails = fetched
+        with metrics.span('issueParse'):
+            return [self.parseBoardIssues(boardIssues, issuesData, issuesDetails) for boardIssues in boardsIssues]
+            
+    # fetchBoardsIssues from the boards and issues kept in previousStates, with the issues of changes fetched again;
+    # None when the boards have to be fetched: changes are 'full', some state is missing or of another board,
+    # or an issue of changes is on none of the boards (it may have just been added to one)
+    def refetchIssues(self, jiraBoardIds, previousStates, changes):
+        if changes.get('full'):
+            return None
+        for jiraBoardId, previousState in zip(jiraBoardIds, previousStates):
+            if (not 'jira' in previousState) or (previousState['jira']['board'] != jiraBoardId):
+                return None
+                
+        issuesData = {}
+        issuesDetails = {}
+        for previousState in previousStates:
+            issuesData.update(previousState['jira']['issuesData'])
+            issuesDetails.update(previousState['jira']['issuesDetails'])
+        keys = set(changes.get('issues', []))
+        if any(not key in issuesData for key in keys):
+            return None
+        keys.update(self.getBranchIssueKeys(issuesData, issuesDetails, changes.get('links', [])))
+        
+        # only the subtasks and linked issues not seen yet come with them
+        registry = issueRegistry.IssueRegistry()
+        for key in issuesData:
+            if not key in keys:
+                registry.request(key)
+        with metrics.span('issueFetch'):
+            changedData, changedDetails = self.prefetchIssues(sorted(keys), True, registry)
+        issuesData.update(changedData)
+        issuesDetails.update(changedDetails)
+        
+        # the board fields of the issue follow its new status
+        boardsIssues = []
+        for previousState in previousStates:
+            boardIssues = []
+            for majorIssueData in previousState['jira']['boardIssues']:
+                if majorIssueData['key'] in changedData:
+                    fields = dict(majorIssueData['fields'])
+                    fields['status'] = changedData[majorIssueData['key']]['fields']['status']
+                    majorIssueData = dict(majorIssueData)
+                    majorIssueData['fields'] = fields
+                boardIssues.append(majorIssueData)
+            boardsIssues.append(boardIssues)
+        return boardsIssues, issuesData, issuesDetails
+        
+    # keys of the issues whose development information (branches, pull requests) names one of the branches in names,
+    # and of the issues whose keys are part of those names (a branch just created for the issue)
+    def getBranchIssueKeys(self, issuesData, issuesDetails, names):
+        names = set(names)
+        keys = set()
+        for name in names:
+            keys.update(key for key in re.findall('[A-Z][A-Z0-9]*-[0-9]+', name.upper()) if key in issuesData)
+            
+        issueKeys = dict((data['id'], key) for key, data in issuesData.items())
+        for id, issueDetails in issuesDetails.items():
+            for detail in issueDetails['detail']:
+                branchNames = ([branch['name'] for branch in detail['branches']]
+                               + [pullRequest['source']['branch'] for pullRequest in detail['pullRequests']])
+                if (id in issueKeys) and not names.isdisjoint(branchNames):
+                    keys.add(issueKeys[id])
+        return keys
+            
+    # parses the issues of a board from the prefetched issuesData and issuesDetails, returns an issueRegistry.IssueRegistry
+    def parseBoardIssues(self, boardIssues, issuesData, issuesDetails):
+        registry = issueRegistry.IssueRegistry()
+        
+        # parses every key once, returns None when the issue cannot be parsed; fetch errors propagate
+        def parseIssue(key):
+            if registry.hasKey(key):
+                return registry.getByKey(key)
+            if registry.getError(key):
+                return None
+                
+            issueData = issuesData[key] if key in issuesData else self.jira.getIssue(key)
             try:
-                issue = self.parseIssue(issueData)
-            except:
+                issue = self.parseIssue(issueData, issuesDetails.get(issueData['id']))
+            except Exception as error:
+                registry.fail(key, error)
+                return None
+            registry.add(issueData['id'], issue, key)
+            return issue
+        
+        for majorIssueData in boardIssues:
+            issue = parseIssue(majorIssueData['key'])
+            if issue is None:
                 continue
             
             
@@ -265,32 +740,158 @@ class Logic:
                 issue['epic'] = majorIssueData['fields']['epic']['name']
                 issue['epicColor'] = majorIssueData['fields']['epic']['color']['key']
                 
-            issues[issueData['id']] = issue
-            
             if 'subtasks' in issue:
                 for subtaskKey in issue['subtasks']:
-                    subtaskData = self.jira.getIssue(subtaskKey)
-                    try:
-                        issues[subtaskData['id']] = self.parseIssue(subtaskData)
-                    except:
-                        continue
+                    parseIssue(subtaskKey)
                     
             if 'links' in issue:
-                # Parse only linked issues that haven't been parsed yet
                 for linkData in issue['links']:
-                    found = False
-                    for id, data in issues.items():
-                        if data['code'] == linkData['key']:
-                            found = True
-                            break
+                    if parseIssue(linkData['key']) is None:
+                        raise registry.getError(linkData['key'])
+        
+        return registry
+        
+    # fetches the board issues, their subtasks and linked issues and the dev-status details
+    # of project issues concurrently, in waves following the dependencies between them;
+    # returns ({key: issueData}, {issueId: issueDetails}), failed requests are left out;
+    # cached records keep the time they were last checked when a failed request leaves them unconfirmed
+    def prefetchIssues(self, keys, fullRefresh=False, registry=None):
+        cache = self.openIssueCache()
+        syncStart = time.time()
+        useCache = bool(cache) and not fullRefresh
+        detailsTtl = self.config['issueCache'].get('detailsTtl', 3600) if cache else 0
+        
+        if registry is None:
+            registry = issueRegistry.IssueRegistry()
+        issuesData = {}
+        issuesDetails = {}
+        issueKeys = [key for key in keys if registry.request(key)]
+        detailIds = []
+        boardIssues = True
+        while len(issueKeys) + len(detailIds) != 0:
+            # cached issues are reused unless JIRA reports them updated since they were checked
+            cachedIssues = {}
+            if useCache:
+                cachedIssues = cache.getIssues(issueKeys)
+                
+            tasks = (self.getIssueTasks([key for key in issueKeys if not key in cachedIssues])
+                     + self.getChangedIssueTasks(cachedIssues)
+                     + [('details', id) for id in detailIds])
+            fetched = []
+            uncheckedKeys = []
+            for (kind, key), data in zip(tasks, self.jira.map(self.prefetch, tasks)):
+                if data is None:
+                    if kind == 'changed':
+                        uncheckedKeys.extend(key[0])
+                    continue
+                if kind == 'changed':
+                    cache.setChecked(key[0], syncStart)
+                if kind == 'details':
+                    issuesDetails[key] = data
+                    if cache:
+                        cache.putDetails(key, data)
+                elif kind == 'search' or kind == 'changed':
+                    fetched.extend(data)
+                else:
+                    fetched.append(data)
+                    
+            # cached issues of a failed 'changed' search are fetched again in full,
+            # the cached records are used only when that fails too
+            if uncheckedKeys:
+                retryTasks = self.getIssueTasks(uncheckedKeys)
+                for (kind, key), data in zip(retryTasks, self.jira.map(self.prefetch, retryTasks)):
+                    if data is None:
+                        continue
+                    if kind == 'search':
+                        fetched.extend(data)
+                    else:
+                        fetched.append(data)
                     
-                    if not found:
-                        linkedIssueData = self.jira.getIssue(linkData['key'])
-                        issues[linkedIssueData['id']] = self.parseIssue(linkedIssueData)
+            changedKeys = set()
+            for data in fetched:
+                changedKeys.add(data['key'])
+                if cache:
+                    cache.putIssue(data, syncStart)
+            for key, (checked, data) in cachedIssues.items():
+                if not key in changedKeys:
+                    fetched.append(data)
+            
+            issueKeys = []
+            detailIds = []
+            for data in fetched:
+                issuesData[data['key']] = data
+                if ('projectKey' in self.config['jira']) and self.isProjectIssue(data['key']):
+                    issueDetails = None
+                    if useCache and (not data['key'] in changedKeys):
+                        issueDetails = cache.getDetails(data['id'], detailsTtl)
+                    if issueDetails is None:
+                        detailIds.append(data['id'])
+                    else:
+                        issuesDetails[data['id']] = issueDetails
+                    
+                if boardIssues:
+                    try:
+                        relatedKeys = self.getIssueSubtasks(data) + [link['key'] for link in self.getIssueLinks(data)]
+                    except (KeyError, TypeError):
+                        continue
+                    for relatedKey in relatedKeys:
+                        if registry.request(relatedKey):
+                            issueKeys.append(relatedKey)
+                            
+            boardIssues = False
+            
+        if cache:
+            cache.evict()
+            print('Issue cache: ' + str(cache.statistics()))
+            cache.close()
+        return issuesData, issuesDetails
+        
+    # searches for the cached issues ({key: (checked, issueData)}) updated since they were checked, in batches
+    # of similar check times searching from the earliest one; it is moved back by config['issueCache']['syncMargin']
+    # hours as JQL dates are in the JIRA user's time zone
+    def getChangedIssueTasks(self, cachedIssues):
+        margin = self.config['issueCache'].get('syncMargin', 14)
+        keys = sorted(cachedIssues, key=lambda key: cachedIssues[key][0])
+        batchSize = self.config['jira'].get('searchBatchSize', 100) or 100
+        tasks = []
+        for index in range(0, len(keys), batchSize):
+            batch = keys[index:index + batchSize]
+            since = time.strftime('%Y/%m/%d %H:%M', time.localtime(cachedIssues[batch[0]][0] - margin * 3600))
+            tasks.append(('changed', (batch, since)))
+        return tasks
+        
+    # persistent issue cache configured by config['issueCache'] ({'path', 'maxAge', 'detailsTtl', 'syncMargin'})
+    def openIssueCache(self):
+        if not 'issueCache' in self.config:
+            return None
+        return issueCache.IssueCache(self.config['issueCache']['path'], self.config['issueCache'].get('maxAge', 30))
         
-        return issues
+    # issue requests for keys: 'key in (...)' searches of config['jira']['searchBatchSize'] keys,
+    # or one request per key when it is 0
+    def getIssueTasks(self, keys):
+        batchSize = self.config['jira'].get('searchBatchSize', 100)
+        if batchSize == 0:
+            return [('issue', key) for key in keys]
+        return [('search', keys[index:index + batchSize]) for index in range(0, len(keys), batchSize)]
+        
+    def prefetch(self, task):
+        kind, key = task
+        try:
+            if kind == 'details':
+                return self.jira.getIssueDetails(key)
+            if kind == 'search':
+                return self.jira.searchAll('key in ({0})'.format(','.join(key)), jira.JIRA.issueFields, len(key))
+            if kind == 'changed':
+                keys, since = key
+                return self.jira.searchAll('key in ({0}) AND updated >= "{1}"'.format(','.join(keys), since), jira.JIRA.issueFields, len(keys))
+            return self.jira.getIssue(key)
+        except jira.JIRA.JIRAError:
+            return None
+            
+    def isProjectIssue(self, key):
+        return key.startswith(self.config['jira']['projectKey'])
         
-    def parseIssue(self, issueData):
+    def parseIssue(self, issueData, issueDetails=None):
         issue = {
             'code': issueData['key'],
             'type': ''.join(issueData['fields']['issuetype']['name'].split()),
@@ -314,8 +915,10 @@ class Logic:
         if len(links) != 0:
             issue['links'] = links
 
-        if issueData['key'].startswith(self.config['jira']['projectKey']):
-            issue.update(self.parseIssueDetails(self.jira.getIssueDetails(issueData['id'])))
+        if self.isProjectIssue(issueData['key']):
+            if issueDetails is None:
+                issueDetails = self.jira.getIssueDetails(issueData['id'])
+            issue.update(self.parseIssueDetails(issueDetails))
             
         return issue
         
@@ -0,0 +1,77 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import contextlib
+import threading
+import json
+import time
+
+# measurements of one run: timing spans of its phases, counts and durations of external calls
+# (git subcommands, JIRA endpoints) and totals such as bytes written; fed from worker threads too
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+        
+    def clear(self):
+        with self.lock:
+            self.started = time.time()
+            self.spans = collections.OrderedDict()
+            self.calls = {}
+            self.totals = {}
+            
+    # times the enclosed block; repeated spans of one name are summed
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.addSpan(name, time.time() - start)
+            
+    def addSpan(self, name, seconds):
+        with self.lock:
+            span = self.spans.setdefault(name, {'count': 0, 'seconds': 0.0})
+            span['count'] += 1
+            span['seconds'] += seconds
+            
+    def addCall(self, group, name, seconds=0.0):
+        with self.lock:
+            call = self.calls.setdefault(group, {}).setdefault(name, {'count': 0, 'seconds': 0.0})
+            call['count'] += 1
+            call['seconds'] += seconds
+            
+    def add(self, name, value):
+        with self.lock:
+            self.totals[name] = self.totals.get(name, 0) + value
+            
+    def toObject(self):
+        with self.lock:
+            rounded = lambda item: {'count': item['count'], 'seconds': round(item['seconds'], 3)}
+            return {
+                'started': self.started,
+                'spans': collections.OrderedDict((name, rounded(span)) for name, span in self.spans.items()),
+                'calls': dict((group, dict((name, rounded(call)) for name, call in calls.items())) for group, calls in self.calls.items()),
+                'totals': dict(self.totals)
+                }
+                
+    # one line per span, e.g. for the console
+    def summary(self):
+        return ', '.join('{0} {1:.1f} s'.format(name, span['seconds']) for name, span in self.toObject()['spans'].items())
+        
+    def save(self, filePath):
+        with open(filePath, 'w') as outfile:
+            json.dump(self.toObject(), outfile, indent=4)
+
+# the metrics of the current run, shared by all modules
+current = Metrics()
+
+def span(name):
+    return current.span(name)
+    
+def addCall(group, name, seconds=0.0):
+    current.addCall(group, name, seconds)
+    
+def add(name, value):
+    current.add(name, value)
@@ -1,90 +1,166 @@
 ﻿#!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+# usage: run.py destination [--serve port] [--hooks port [--hooks-host host] [--hooks-secret secret]]
+
 import logic
+import graphServer
+import webhooks
+import argparse
 import datetime
-import time
 import os
 import shutil
-import sys
+import traceback
 from distutils import dir_util
 
-destinationOutDir = sys.argv[1]
+parser = argparse.ArgumentParser(description='Writes the boards of targets to destination, again on every change.')
+parser.add_argument('destination', help='directory the boards are written to')
+parser.add_argument('--serve', type=int, metavar='port', help='serves destination and pushes the changes to open boards')
+parser.add_argument('--hooks', type=int, metavar='port', help='receives the JIRA and Stash webhooks')
+parser.add_argument('--hooks-host', default='127.0.0.1', metavar='host', help='interface the webhooks are received on (default: 127.0.0.1)')
+parser.add_argument('--hooks-secret', metavar='secret', help='accepts only the webhook URLs ending with ?secret=<secret>')
+arguments = parser.parse_args()
 
-startTimes = [
-    "07:00",
-    "08:30",
-    "09:30",
-    "10:30",
-    "11:30",
-    "12:30",
-    "13:30",
-    "14:00",
-    "14:30",
-    "15:00",
-    "15:30",
-    "16:00",
-    "17:00",
-    "18:00"
-    ]
+destinationOutDir = arguments.destination
+servePort = arguments.serve
+hookPort = arguments.hooks
+hookHost = arguments.hooks_host
+hookSecret = arguments.hooks_secret
+
+# full runs catching what the webhooks missed: every reconcileInterval seconds, on work days within workHours
+reconcileInterval = 3600
+workHours = (7, 19)
 
 logicConfig = {
         'jira': {
             'url': 'https://jira.atlassian.com',
-            'auth': None
+            'auth': None,
+            'workers': 8
             },
         'git': {
             'repository': 'C:\\git',
-            'repositoryName': 'avg'
+            'repositoryName': 'avg',
+            'pooled': True,
+            'mergeEngine': 'mergeTree',
+            'conflictWorkers': 8,
+            'graphPath': 'gitGraph.json'
             },
         'stash': {
             'url': 'https://stash.atlassian.com/commit/'
+            },
+        'conflictCache': {
+            'path': 'conflicts.sqlite',
+            'maxEntries': 100000,
+            'maxAge': 30
+            },
+        'issueCache': {
+            'path': 'issues.sqlite',
+            'detailsTtl': 3600
+            },
+        'output': {
+            'compact': True,
+            'compressions': ['gz'],
+            'shards': 'details'
+            },
+        'metrics': {
+            'fileName': 'metrics.json',
+            'profile': None
             }
       }
+
+# boards written in one run, each to its own directory of destinationOutDir
+targets = [
+    {
+        'board': 588,
+        'directory': '.',
+        'masterBranches': ['zaap/devel'],
+        'additionalBranches': []
+        }
+    ]
       
-def getMinute(startTime):
-    return int(startTime[-2:])
-    
-def getHour(startTime):
-    return int(startTime[:2])
+def getNextReconcile(lastReconcile):
+    nextReconcile = lastReconcile + datetime.timedelta(seconds=reconcileInterval)
+    while (nextReconcile.weekday() >= 5) or not (workHours[0] <= nextReconcile.hour < workHours[1]):
+        if (nextReconcile.weekday() < 5) and (nextReconcile.hour < workHours[0]):
+            nextReconcile = nextReconcile.replace(hour=workHours[0], minute=0, second=0, microsecond=0)
+        else:
+            nextReconcile = (nextReconcile + datetime.timedelta(days=1)).replace(hour=workHours[0], minute=0, second=0, microsecond=0)
+    return nextReconcile
     
-def runLogic():
+states = None
+server = None
+
+def publish():
+    for target in targets:
+        filePath = os.path.join(destinationOutDir, target['directory'], 'data.json')
+        if os.path.exists(filePath):
+            server.publish('/' + target['directory'] + '/data.json', filePath)
+
+# copy_tree only adds files: the shards of nodes no longer on a written board are deleted
+def removeStaleShards(tmpDir):
+    shardDirectory = logicConfig['output'].get('shards')
+    if not shardDirectory:
+        return
+    for target, state in zip(targets, states):
+        if state['skipped']:
+            continue
+        writtenDir = os.path.join(tmpDir, target['directory'], shardDirectory)
+        publishedDir = os.path.join(destinationOutDir, target['directory'], shardDirectory)
+        if not os.path.isdir(publishedDir):
+            continue
+        for name in os.listdir(publishedDir):
+            if not os.path.exists(os.path.join(writtenDir, name)):
+                os.remove(os.path.join(publishedDir, name))
+
+# changes (webhooks.py) limit the run to what they name
+def runLogic(changes=None):
+    global states
     tmpDir = 'tmp_out'
     if os.path.exists(tmpDir):
         shutil.rmtree(tmpDir, ignore_errors=True)
     os.makedirs(tmpDir)
+    
+    runTargets = []
+    for target in targets:
+        targetDir = os.path.join(tmpDir, target['directory'])
+        if not os.path.exists(targetDir):
+            os.makedirs(targetDir)
+        runTarget = dict(target)
+        runTarget['filePath'] = os.path.join(targetDir, 'data.json')
+        runTargets.append(runTarget)
             
     l = logic.Logic(logicConfig)
-    l.createGraph(588, tmpDir + '/data.json', masterBranches=['zaap/devel'], additionalBranches=[])
+    states = l.createGraphs(runTargets, previousStates=states, changes=changes)
+    if all(state['skipped'] for state in states):
+        print("Nothing changed")
+        return
     
     dir_util.copy_tree(tmpDir, destinationOutDir, update=True)
+    removeStaleShards(tmpDir)
+    if server:
+        publish()
+    
+queue = webhooks.ChangeQueue()
+if servePort:
+    server = graphServer.GraphServer(destinationOutDir, servePort).start()
+    publish()
+if hookPort:
+    webhooks.WebhookServer(queue, logicConfig['git']['repositoryName'], hookPort, hookHost, hookSecret).start()
     
+lastReconcile = datetime.datetime.now()
 runLogic()
 while True:
-    now = datetime.datetime.now()
+    nextReconcile = getNextReconcile(lastReconcile)
+    print("Next full run at " + nextReconcile.strftime('%a %H:%M'))
     
-    nextStartTime = "24:00"
-    perform = False
-    
-    if now.weekday() < 5: # work-days only
-        for startTime in startTimes:
-            if (now.hour < getHour(startTime)) or ((now.hour == getHour(startTime)) and (now.minute < getMinute(startTime))):
-                nextStartTime = startTime
-                perform = True
-                break
-            
-    print("Next run in " + nextStartTime)
-
-    minutesToWait = 60*(getHour(nextStartTime) - now.hour) + (getMinute(nextStartTime) - now.minute)
-    if minutesToWait > 0:
-        time.sleep(minutesToWait * 60)
-    
-    if not perform:
-        continue
-        
-    print("Performing at " + nextStartTime)
+    changes = queue.get(max((nextReconcile - datetime.datetime.now()).total_seconds(), 0))
+    if (changes is None) or changes['full']:
+        lastReconcile = datetime.datetime.now()
+        changes = None
+        print("Performing full run")
+    else:
+        print("Updating " + webhooks.describe(changes))
     try:
-        runLogic()
-    except:
-        pass
-    
+        runLogic(changes)
+    except Exception:
+        traceback.print_exc()
@@ -0,0 +1,93 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Logic.createGraphs of several targets against createGraph of each target alone, on a repository of
+# benchRepository with criss-cross merges and issues served by benchJira, usage: testCreateGraphs.py [git]
+
+import benchJira
+import benchRepository
+import json
+import logic
+import os
+import shutil
+import sys
+import tempfile
+
+gitExecutable = sys.argv[1] if len(sys.argv) > 1 else 'git'
+
+# x1 and x2 on master, a = merge(x1, x2) and b = merge(x2, x1), pushed to origin as new branches
+def addCrissCross(clonePath):
+    def run(args):
+        return benchRepository.runGit(gitExecutable, args, cwd=clonePath).strip()
+    tree = run(['rev-parse', 'origin/master^{tree}'])
+    commits = {}
+    for name in ['x1', 'x2']:
+        commits[name] = run(['commit-tree', tree, '-p', 'origin/master', '-m', name])
+    commits['a'] = run(['commit-tree', tree, '-p', commits['x1'], '-p', commits['x2'], '-m', 'Merge x2 into x1'])
+    commits['b'] = run(['commit-tree', tree, '-p', commits['x2'], '-p', commits['x1'], '-m', 'Merge x1 into x2'])
+    for name, commit in commits.items():
+        run(['push', '--quiet', 'origin', commit + ':refs/heads/cross/' + name])
+    run(['fetch', '--quiet'])
+    return dict((name, 'cross/' + name) for name in commits)
+
+# data.json without the timestamp and with the sets in a fixed order
+def loadGraph(filePath):
+    with open(filePath, 'r') as infile:
+        content = json.load(infile)
+    del content['timestamp']
+    content['nodes'].sort(key=lambda node: node['id'])
+    for node in content['nodes']:
+        if 'successors' in node['data']:
+            node['data']['successors'].sort()
+    content['edges'].sort(key=lambda edge: json.dumps(edge, sort_keys=True))
+    for pruning in content['prunings'].values():
+        for nodeIds in pruning.values():
+            nodeIds.sort()
+    return content
+
+def createLogic(jiraUrl, clonePath, graphPath):
+    return logic.Logic({
+        'jira': {'url': jiraUrl, 'auth': None, 'projectKey': 'ZPL', 'workers': 4},
+        'git': {'repository': clonePath, 'repositoryName': 'bench', 'executable': gitExecutable, 'pooled': True, 'mergeEngine': 'mergeTree', 'graphPath': graphPath},
+        'stash': {'url': 'commit/'},
+        'output': {'shards': 'details'}
+        })
+
+path = tempfile.mkdtemp()
+try:
+    clonePath, names, conflicts = benchRepository.createRepository(os.path.join(path, 'repository'), 20, seed=1, gitExecutable=gitExecutable)
+    cross = addCrissCross(clonePath)
+    issues, details, board = benchJira.createIssues(names, 30)
+    jira = benchJira.FakeJira(issues, details, board).start()
+    targets = [
+        {'board': 1, 'directory': 'cross', 'masterBranches': ['master'], 'additionalBranches': [cross['a'], cross['b']]},
+        {'board': 1, 'directory': 'crossAndBase', 'masterBranches': ['master'], 'additionalBranches': [cross['a'], cross['b'], cross['x2']]},
+        {'board': 1, 'directory': 'twoMasters', 'masterBranches': ['master', names[2]], 'additionalBranches': []}
+        ]
+    graphPath = os.path.join(path, 'gitGraph.json')
+    try:
+        runTargets = []
+        for target in targets:
+            runTarget = dict(target)
+            runTarget['filePath'] = os.path.join(path, 'multi', target['directory'], 'data.json')
+            os.makedirs(os.path.dirname(runTarget['filePath']))
+            runTargets.append(runTarget)
+        createLogic(jira.url, clonePath, graphPath).createGraphs(runTargets)
+
+        failures = 0
+        for target, runTarget in zip(targets, runTargets):
+            filePath = os.path.join(path, 'single', target['directory'], 'data.json')
+            os.makedirs(os.path.dirname(filePath))
+            if os.path.exists(graphPath):
+                os.remove(graphPath)
+            createLogic(jira.url, clonePath, graphPath).createGraph(target['board'], filePath, target['masterBranches'], target['additionalBranches'])
+            if loadGraph(runTarget['filePath']) != loadGraph(filePath):
+                failures += 1
+                print(target['directory'] + ': the graph differs from the single target run')
+    finally:
+        jira.stop()
+    print(str(len(targets)) + ' targets, ' + str(failures) + ' failures')
+    if failures:
+        sys.exit(1)
+finally:
+    shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,76 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# graph.splitDetails of every Node.detailFields entry merged back by mergeDetails of graph.js,
+# the merged node data has to be the original one, usage: testDetails.py [node]
+
+import graph
+import json
+import re
+import subprocess
+import sys
+
+nodeExecutable = sys.argv[1] if len(sys.argv) > 1 else 'node'
+
+reviewers = [{'name': 'reviewer1', 'approved': True}, {'name': 'reviewer2', 'approved': False}]
+nodes = {
+    graph.Node.Type.JIRA: {
+        'type': 'Story', 'URL': 'http://jira/ZPL-1', 'code': 'ZPL-1', 'summary': 'Story', 'assignee': 'Assignee',
+        'status': 'In Progress', 'statusColor': 'yellow', 'completed': 1, 'estimated': 2,
+        'branches': [{'name': 'feature/ZPL-1', 'URL': 'http://stash/branch', 'repository': 'repo'}],
+        'pullRequests': [
+            {'id': '1', 'name': 'PR 1', 'source': 'feature/ZPL-1', 'destination': 'master', 'repository': 'repo',
+             'URL': 'http://stash/pr/1', 'status': 'OPEN', 'reviewers': reviewers},
+            {'id': '2', 'name': 'PR 2', 'source': 'feature/ZPL-1', 'destination': 'release', 'repository': 'repo',
+             'URL': 'http://stash/pr/2', 'status': 'MERGED', 'reviewers': []}
+            ]
+        },
+    graph.Node.Type.GIT: {
+        'type': 'conflict',
+        'info': 'commit 0123456789\nAuthor: author\n\n    message',
+        'files': [
+            {'file': 'a/b.py', 'URL': 'conflicts/a_b.py.diff', 'diff': '<<<<<<<\na\n=======\nb\n>>>>>>>'},
+            {'file': 'c.py', 'URL': 'conflicts/c.py.diff', 'diff': ''}
+            ]
+        },
+    graph.Node.Type.STASH: {'name': 'PR 1', 'URL': 'http://stash/pr/1', 'reviewers': reviewers}
+    }
+
+with open('graph.js', 'rb') as infile:
+    source = infile.read().decode('utf-8-sig')
+mergeDetails = re.search(r'^function mergeDetails\(.*?^}$', source, re.M | re.S).group(0)
+
+cases = []
+for _type, paths in graph.Node.detailFields.items():
+    data = nodes[_type]
+    remaining, details = graph.splitDetails(data, paths)
+    for path in paths:
+        if not path[0] in details:
+            raise Exception('Detail field ' + '.'.join(path) + ' of ' + _type + ' not split')
+    cases.append({'type': _type, 'data': data, 'remaining': remaining, 'details': details})
+
+script = '''
+var $ = {
+    isArray: Array.isArray,
+    isPlainObject: function (value) { return value !== null && typeof value === 'object' && !Array.isArray(value); }
+};
+''' + mergeDetails + '''
+var cases = JSON.parse(require('fs').readFileSync(0, 'utf-8'));
+console.log(JSON.stringify(cases.map(function (test) {
+    mergeDetails(test.remaining, test.details);
+    return test.remaining;
+})));
+'''
+process = subprocess.Popen([nodeExecutable, '-e', script], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+output = process.communicate(json.dumps(cases).encode('utf-8'))[0]
+if process.returncode != 0:
+    sys.exit(1)
+
+failures = 0
+for test, merged in zip(cases, json.loads(output.decode('utf-8'))):
+    if merged != test['data']:
+        failures += 1
+        print(test['type'] + ': ' + json.dumps(merged, sort_keys=True) + ' instead of ' + json.dumps(test['data'], sort_keys=True))
+print(str(len(cases)) + ' node types, ' + str(failures) + ' failures')
+if failures:
+    sys.exit(1)
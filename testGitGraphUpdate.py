@@ -0,0 +1,136 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# GitGraph.update() of a loaded or copied graph against addAll of the same tips from scratch, for every
+# change of the tip set in a criss-cross history and in one of feature branches; in the latter the loaded
+# graph walks nothing to drop tips and only the commits above its oldest node to add tips descending from
+# it, usage: testGitGraphUpdate.py [git]
+
+import benchRepository
+import git
+import gitGraph
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+
+gitExecutable = sys.argv[1] if len(sys.argv) > 1 else 'git'
+
+def getRun(path):
+    def run(args):
+        return benchRepository.runGit(gitExecutable, ['-c', 'user.name=test', '-c', 'user.email=test@test'] + args, cwd=path)
+    run(['init', '-q'])
+    return run
+
+# O -> x1, x2; a = merge(x1, x2), b = merge(x2, x1): a and b have two best common ancestors
+def createCrissCross(path):
+    run = getRun(path)
+    run(['commit', '-q', '--allow-empty', '-m', 'O'])
+    run(['branch', '-M', 'master'])
+    run(['checkout', '-q', '-b', 'x1'])
+    run(['commit', '-q', '--allow-empty', '-m', 'x1'])
+    run(['checkout', '-q', '-b', 'x2', 'master'])
+    run(['commit', '-q', '--allow-empty', '-m', 'x2'])
+    run(['checkout', '-q', '-b', 'a', 'x1'])
+    run(['merge', '-q', '--no-ff', '-m', 'a', 'x2'])
+    run(['checkout', '-q', '-b', 'b', 'x2'])
+    run(['merge', '-q', '--no-ff', '-m', 'b', 'x1'])
+    return ['master', 'x1', 'x2', 'a', 'b']
+
+# master O - m1 - m2 - m3 - merge(f3); f1 from m1, f2 from m2 with m3 merged in, f3 from m2
+def createFeatures(path):
+    run = getRun(path)
+    for message in ['O', 'm1']:
+        run(['commit', '-q', '--allow-empty', '-m', message])
+    run(['branch', '-M', 'master'])
+    run(['checkout', '-q', '-b', 'f1'])
+    run(['commit', '-q', '--allow-empty', '-m', 'f1'])
+    run(['checkout', '-q', 'master'])
+    run(['commit', '-q', '--allow-empty', '-m', 'm2'])
+    for name in ['f2', 'f3']:
+        run(['checkout', '-q', '-b', name, 'master'])
+        run(['commit', '-q', '--allow-empty', '-m', name])
+    run(['checkout', '-q', 'master'])
+    run(['commit', '-q', '--allow-empty', '-m', 'm3'])
+    run(['checkout', '-q', 'f2'])
+    run(['merge', '-q', '--no-ff', '-m', 'f2 merge', 'master'])
+    run(['checkout', '-q', 'master'])
+    run(['merge', '-q', '--no-ff', '-m', 'merge f3', 'f3'])
+    return ['master', 'f1', 'f2', 'f3']
+
+def getEdges(g):
+    return set((P, id) for id in g.nodes for P in g.getPredecessors(id))
+
+def getGraph(repository, tips, loadPath=None, source=None):
+    if source:
+        g = source.copy()
+    else:
+        g = gitGraph.GitGraph(repository)
+        if loadPath:
+            g.load(loadPath)
+    g.update(dict((name, name) for name in tips))
+    g.getDistances()
+    return g
+
+# counts the commits walked by repository.getAncestry
+def countWalks(repository):
+    getAncestry = repository.getAncestry
+    def countedGetAncestry(ids, exclude=()):
+        ancestry = getAncestry(ids, exclude)
+        repository.walkedCommits += len(ancestry)
+        return ancestry
+    repository.getAncestry = countedGetAncestry
+    repository.walkedCommits = 0
+
+def isAncestor(path, ancestor, id):
+    try:
+        benchRepository.runGit(gitExecutable, ['merge-base', '--is-ancestor', ancestor, id], cwd=path)
+        return True
+    except Exception:
+        return False
+
+def check(path, names, checkWalks):
+    repository = git.GIT(path, gitExecutable)
+    countWalks(repository)
+    graphPath = os.path.join(path, 'gitGraph.json')
+    tipSets = [tips for count in range(1, len(names) + 1) for tips in itertools.combinations(names, count)]
+    failures = 0
+    for previousTips in tipSets:
+        previous = getGraph(repository, previousTips)
+        previous.save(graphPath)
+        for tips in tipSets:
+            expected = getGraph(repository, tips)
+            walks = repository.walkedCommits
+            loaded = getGraph(repository, tips, loadPath=graphPath)
+            walks = repository.walkedCommits - walks
+            
+            change = ','.join(previousTips) + ' -> ' + ','.join(tips)
+            tipIds = set(repository.revParseAll(list(tips)))
+            if checkWalks and tipIds.issubset(previous.nodes) and walks:
+                failures += 1
+                print('load ' + change + ': ' + str(walks) + ' commits walked to drop tips')
+            elif checkWalks and all(isAncestor(path, previous.boundary[0], id) for id in tipIds):
+                bound = len(repository.getAncestry(list(tipIds | previous.nodes), previous.boundary[1]))
+                if walks > bound:
+                    failures += 1
+                    print('load ' + change + ': ' + str(walks) + ' commits walked instead of at most ' + str(bound))
+                    
+            for method, g in [('load', loaded), ('copy', getGraph(repository, tips, source=previous))]:
+                if (g.nodes != expected.nodes) or (getEdges(g) != getEdges(expected)) or (g.getDistances() != expected.getDistances()):
+                    failures += 1
+                    print(method + ' ' + change + ': ' + str(sorted(g.nodes)) + ' instead of ' + str(sorted(expected.nodes)))
+    print(os.path.basename(path) + ': ' + str(len(tipSets) ** 2) + ' tip changes, ' + str(failures) + ' failures')
+    return failures
+
+path = tempfile.mkdtemp()
+try:
+    failures = 0
+    for name, create, checkWalks in [('crissCross', createCrissCross, False), ('features', createFeatures, True)]:
+        repositoryPath = os.path.join(path, name)
+        os.makedirs(repositoryPath)
+        failures += check(repositoryPath, create(repositoryPath), checkWalks)
+    if failures:
+        sys.exit(1)
+finally:
+    shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,45 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# posts sample JIRA and Stash webhook payloads to a running run.py --hooks 8081,
+# usage: testWebhooks.py [url] [issueKey] [branchName] [repositoryName]
+
+import requests
+import json
+import sys
+
+url = sys.argv[1] if len(sys.argv) > 1 else 'http://localhost:8081/'
+issueKey = sys.argv[2] if len(sys.argv) > 2 else 'ZPL-1'
+branchName = sys.argv[3] if len(sys.argv) > 3 else 'feature/' + issueKey
+repositoryName = sys.argv[4] if len(sys.argv) > 4 else 'avg'
+
+repository = {'slug': repositoryName, 'name': repositoryName}
+payloads = [
+    {
+        'webhookEvent': 'jira:issue_updated',
+        'issue': {'key': issueKey},
+        'changelog': {'items': [{'field': 'status', 'fromString': 'Open', 'toString': 'In Progress'}]}
+        },
+    {
+        'eventKey': 'repo:refs_changed',
+        'repository': repository,
+        'changes': [{
+            'ref': {'id': 'refs/heads/' + branchName, 'displayId': branchName, 'type': 'BRANCH'},
+            'fromHash': '0' * 40,
+            'toHash': 'f' * 40,
+            'type': 'UPDATE'
+            }]
+        },
+    {
+        'eventKey': 'pr:opened',
+        'pullRequest': {
+            'id': 1,
+            'fromRef': {'displayId': branchName, 'repository': repository},
+            'toRef': {'displayId': 'master', 'repository': repository}
+            }
+        }
+    ]
+
+for payload in payloads:
+    response = requests.post(url, data=json.dumps(payload), headers={'Content-Type': 'application/json'})
+    print((payload.get('webhookEvent') or payload.get('eventKey')) + ' ' + str(response.status_code))
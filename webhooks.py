@@ -0,0 +1,176 @@
+﻿#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# receiver of the JIRA and Stash (Bitbucket Server) webhooks: each event becomes changes for
+# logic.Logic.createGraphs, {'issues': issue keys to fetch again, 'branches': names of the branches
+# whose tips moved, 'links': names of the branches whose issues may have got or lost them or
+# their pull requests, 'full': True when only fetching the boards again helps}; the changes of
+# events coming in quick succession are handed over together
+
+import hmac
+import json
+import threading
+import time
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import urlparse, parse_qs
+import graphServer
+
+def createChanges():
+    return {'issues': set(), 'branches': set(), 'links': set(), 'full': False}
+
+def mergeChanges(changes, other):
+    for key in ['issues', 'branches', 'links']:
+        changes[key].update(other[key])
+    changes['full'] = changes['full'] or other['full']
+
+def isEmpty(changes):
+    return not (changes['issues'] or changes['branches'] or changes['links'] or changes['full'])
+
+def describe(changes):
+    if changes['full']:
+        return 'all'
+    return ', '.join(key + ' ' + ' '.join(sorted(changes[key])) for key in ['issues', 'branches', 'links'] if changes[key])
+
+# changes of a webhook payload; Stash events of other repositories than repositoryName are ignored
+def getChanges(payload, repositoryName):
+    if 'webhookEvent' in payload:
+        return getJiraChanges(payload)
+    return getStashChanges(payload, repositoryName)
+
+# issue events change the issue; sprint and board events, deleted issues and issues moved
+# between sprints change the boards
+def getJiraChanges(payload):
+    changes = createChanges()
+    event = payload['webhookEvent']
+    if event.startswith('sprint_') or event.startswith('board_') or event == 'jira:issue_deleted':
+        changes['full'] = True
+    elif event.startswith('jira:issue_'):
+        changes['issues'].add(payload['issue']['key'])
+        for item in payload.get('changelog', {}).get('items', []):
+            if item.get('field') == 'Sprint':
+                changes['full'] = True
+    return changes
+
+# pushes move the tips of the branches, created and deleted branches and pull request events
+# change the development information of their issues; both the 'repo:refs_changed' and 'pr:*'
+# events of Bitbucket Server and the 'refChanges' of the Stash post-receive hook are understood
+def getStashChanges(payload, repositoryName):
+    changes = createChanges()
+    repository = payload.get('repository') or payload.get('pullRequest', {}).get('toRef', {}).get('repository', {})
+    if not repositoryName in [repository.get('name'), repository.get('slug')]:
+        return changes
+
+    refChanges = payload.get('changes') or payload.get('refChanges') or []
+    for refChange in refChanges:
+        refId = refChange['ref']['id'] if 'ref' in refChange else refChange['refId']
+        if not refId.startswith('refs/heads/'):
+            continue
+        name = refId[len('refs/heads/'):]
+        changes['branches'].add(name)
+        if refChange.get('type') != 'UPDATE':
+            changes['links'].add(name)
+
+    if 'pullRequest' in payload:
+        pullRequest = payload['pullRequest']
+        source = pullRequest['fromRef']['displayId']
+        changes['links'].add(source)
+        changes['branches'].add(source)
+        if payload.get('eventKey') == 'pr:merged':
+            changes['branches'].add(pullRequest['toRef']['displayId'])
+    return changes
+
+# changes collected from the webhooks, handed over once no other event came for debounce seconds
+# (or maxDelay seconds after the first one at the latest)
+class ChangeQueue:
+    def __init__(self, debounce=10, maxDelay=60):
+        self.debounce = debounce
+        self.maxDelay = maxDelay
+        self.condition = threading.Condition()
+        self.changes = None
+        self.firstTime = None
+        self.lastTime = None
+
+    def add(self, changes):
+        if isEmpty(changes):
+            return
+        with self.condition:
+            now = time.time()
+            if self.changes is None:
+                self.changes = createChanges()
+                self.firstTime = now
+            mergeChanges(self.changes, changes)
+            self.lastTime = now
+            self.condition.notify_all()
+
+    # waits up to timeout seconds for changes, returns None when none came; changes already
+    # coming in are waited for even past timeout
+    def get(self, timeout):
+        deadline = time.time() + timeout
+        with self.condition:
+            while True:
+                now = time.time()
+                if self.changes is not None:
+                    ready = min(self.lastTime + self.debounce, self.firstTime + self.maxDelay)
+                    if now >= ready:
+                        changes = self.changes
+                        self.changes = None
+                        return changes
+                    self.condition.wait(ready - now)
+                elif now >= deadline:
+                    return None
+                else:
+                    self.condition.wait(deadline - now)
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        webhookServer = self.server.webhookServer
+        if not webhookServer.isAuthorized(self.path):
+            self.send_error(403)
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            changes = getChanges(json.loads(body.decode('utf-8')), webhookServer.repositoryName)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.send_error(400)
+            return
+        webhookServer.queue.add(changes)
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+# the webhooks carry no authentication of their own: the server listens on the local interface only
+# unless host says otherwise, and with secret set it accepts only the URLs ending with '?secret=<secret>'
+class WebhookServer:
+    def __init__(self, queue, repositoryName, port=8081, host='127.0.0.1', secret=None):
+        self.queue = queue
+        self.repositoryName = repositoryName
+        self.secret = secret
+        self.server = graphServer.Server((host, port), RequestHandler)
+        self.server.webhookServer = self
+        self.thread = None
+
+    def isAuthorized(self, path):
+        if not self.secret:
+            return True
+        secrets = parse_qs(urlparse(path).query).get('secret', [])
+        return any(hmac.compare_digest(secret.encode('utf-8'), self.secret.encode('utf-8')) for secret in secrets)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()